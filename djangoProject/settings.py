@@ -120,6 +120,56 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 
+# Spell checking backend for parserapp.validators.validate_text:
+# 'yandex' (network Yandex Speller) or 'autocorrect' (offline, local dictionary).
+# SPELLER_OPTIONS holds per-backend keyword arguments, e.g.
+# {'autocorrect': {'lang': 'ru', 'dictionary': '/path/to/word_count.json'}}
+# The autocorrect package ships only the English dictionary and otherwise
+# downloads <lang>.tar.gz on first use. On offline hosts set 'dictionary' to
+# a local word_count.json ({word: frequency}); without it and without the
+# archive in autocorrect/data/ the backend raises ImproperlyConfigured.
+
+SPELLER_BACKEND = 'yandex'
+
+SPELLER_OPTIONS = {}
+
+# Spell check result cache: in-process LRU size and eviction limits
+# of the persistent SpellCheckResult table.
+
+SPELL_CACHE_SIZE = 10000
+
+SPELL_CACHE_MAX_ENTRIES = 100000
+
+SPELL_CACHE_MAX_AGE_DAYS = 90
+
+# Batched spell checking: texts per DB/backend batch and worker threads
+# for network backends.
+
+SPELL_CHECK_BATCH_SIZE = 500
+
+SPELL_CHECK_WORKERS = 8
+
+# Discipline index prefixes per qualification (StudyPlan.qualification).
+# Qualifications not listed use parserapp.validators.DEFAULT_INDEX_PREFIXES.
+
+DISCIPLINE_INDEX_PREFIXES = {}
+
+# Serialized plan trees (parserapp.plan_cache). A file backend is shared by
+# runparser and the web server, so a tree cached after import is served
+# without walking the ORM. Entries are dropped when the loader rewrites a plan.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'plans': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'plan_cache',
+        'TIMEOUT': None,
+        'OPTIONS': {'MAX_ENTRIES': 1000},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
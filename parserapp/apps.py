@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ParserappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'parserapp'
+
+    def ready(self):
+        import parserapp.signals  # noqa: F401
@@ -0,0 +1,405 @@
+import contextlib
+import io
+import os
+import pickle
+import platform
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import xml.etree.ElementTree as et
+from unittest import mock
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.test.utils import CaptureQueriesContext, override_settings
+
+from parserapp.models_loader import (
+    load_json_to_models, load_json_to_models_bulk, collect_texts, collect_indices, collect_plan_strings,
+    DEFAULT_BATCH_SIZE
+)
+from parserapp.hours import plan_to_json
+from parserapp.main import models_to_json
+from parserapp.parser import RUP_parser, XML_NAMESPACE, parse_plan
+from parserapp.plan_cache import PLAN_CACHE_ALIAS
+from parserapp.profiling import StageProfiler
+from parserapp.synthetic import generate_plx, plan_size
+from parserapp.validators import (
+    SPELLER_BACKENDS, get_speller, validate_texts, get_index_validator, validate_discipline_hours,
+    validate_plan_hours, spell_cache
+)
+
+
+# Кеш планов на время measure_pipeline: выгрузка синтетических планов не
+# попадает в кеш проекта, а откат транзакции его не сбрасывает
+BENCHMARK_PLAN_CACHE = {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'benchmark-plans',
+}
+
+
+def measure_parse(filename: str, streaming: bool):
+    """
+    Замеряет время и пиковую память (tracemalloc) чтения файла плана
+    через get_elements_from_file в выбранном режиме.
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+
+    parser = RUP_parser(filename, streaming=streaming)
+    parser.get_elements_from_file()
+
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'mode': 'streaming' if streaming else 'full_tree',
+        'seconds': round(elapsed, 4),
+        'peak_memory_mb': round(peak / 1024 / 1024, 2),
+        'plan_strings': len(parser.plany_stroky) + len(parser.plany_stroky_childs),
+        'hours': len(parser.plany_novie_chasy),
+    }
+
+
+def replicate_plan_strings(filename: str, factor: int):
+    """
+    Возвращает элементы плана, в которых строки плана и их часы повторены
+    factor раз. Копии получают новые коды, но остаются в тех же блоках,
+    поэтому число строк растет линейно, а структура циклов не меняется.
+    """
+    parser = RUP_parser(filename, streaming=True)
+    elements = list(parser.iter_elements_streaming())
+    replicated = list(elements)
+
+    for copy_number in range(1, factor):
+        suffix = f".{copy_number}"
+        for elem in elements:
+            tag_name = elem.tag.replace(XML_NAMESPACE, '')
+            if tag_name == "ПланыСтроки":
+                attrib = dict(elem.attrib, Код=elem.get('Код') + suffix)
+                if elem.get('КодРодителя'):
+                    attrib['КодРодителя'] = elem.get('КодРодителя') + suffix
+            elif tag_name == "ПланыНовыеЧасы":
+                attrib = dict(elem.attrib, КодОбъекта=elem.get('КодОбъекта') + suffix)
+            else:
+                continue
+            replicated.append(et.Element(elem.tag, attrib))
+
+    return replicated
+
+
+def measure_build_scaling(filename: str, factors=(1, 2, 4, 8, 16)):
+    """
+    Замеряет время build_tree при росте числа строк плана. При линейной
+    сборке время на одну строку (seconds_per_string) остается постоянным.
+    """
+    results = []
+    for factor in factors:
+        elements = replicate_plan_strings(filename, factor)
+        parser = RUP_parser(filename, streaming=True)
+        parser.get_elements_from_file(elements)
+        plan_strings = len(parser.plany_stroky) + len(parser.plany_stroky_childs)
+
+        start = time.perf_counter()
+        parser.build_tree()
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            'factor': factor,
+            'plan_strings': plan_strings,
+            'hours': len(parser.plany_novie_chasy),
+            'seconds': round(elapsed, 4),
+            'seconds_per_string': round(elapsed / plan_strings, 6),
+        })
+    return results
+
+
+def measure_loaders(filename: str, batch_size: int = DEFAULT_BATCH_SIZE):
+    """
+    Сравнивает построчный load_json_to_models и пакетный load_json_to_models_bulk
+    на одном плане: время и число SQL-запросов. Проверка орфографии отключается
+    у обоих (validate_text подменяется, пакетному передаются пустые
+    text_warnings), чтобы замер отражал только запись в БД. Каждый загрузчик
+    работает в транзакции, которая откатывается, как в measure_pipeline:
+    загруженные планы в настроенной базе не удаляются.
+    """
+    rup_data = parse_plan(filename)
+    loaders = [
+        ('load_json_to_models', lambda: load_json_to_models(rup_data)),
+        ('load_json_to_models_bulk', lambda: load_json_to_models_bulk(rup_data, batch_size=batch_size, text_warnings={})),
+    ]
+
+    results = []
+    for name, load in loaders:
+        with transaction.atomic(), \
+                mock.patch('parserapp.models_loader.validate_text', return_value=None), \
+                contextlib.redirect_stdout(io.StringIO()), \
+                CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            load()
+            elapsed = time.perf_counter() - start
+            transaction.set_rollback(True)
+
+        results.append({
+            'loader': name,
+            'seconds': round(elapsed, 4),
+            'queries': len(queries),
+        })
+
+    results[1]['speedup'] = round(results[0]['seconds'] / results[1]['seconds'], 1)
+    return results
+
+
+def measure_spellers(filename: str, backends=None):
+    """
+    Замеряет проверку орфографии всех названий плана каждым бэкендом.
+    Тексты передаются прямо в speller.spell, мимо spell_cache и вайтлиста:
+    иначе повторные прогоны замеряли бы кеш и писали в SpellCheckResult.
+    Бэкенд, который не удалось создать (нет сети или словаря), попадает
+    в результаты с описанием ошибки.
+    """
+    texts = collect_texts(parse_plan(filename))
+
+    results = []
+    for name in backends or SPELLER_BACKENDS:
+        try:
+            start = time.perf_counter()
+            speller = get_speller(name)
+            init_seconds = time.perf_counter() - start
+
+            start = time.perf_counter()
+            warnings = sum(1 for text in texts if speller.spell(text))
+            elapsed = time.perf_counter() - start
+        except Exception as e:
+            results.append({'backend': name, 'error': f"{type(e).__name__}: {e}"})
+            continue
+
+        results.append({
+            'backend': name,
+            'texts': len(texts),
+            'init_seconds': round(init_seconds, 4),
+            'seconds': round(elapsed, 4),
+            'ms_per_text': round(elapsed / len(texts) * 1000, 3),
+            'texts_with_warnings': warnings,
+        })
+    return results
+
+
+def measure_index_validation(filename: str, factors=(1, 10, 100)):
+    """
+    Замеряет пакетную проверку индексов дисциплин (validate_plan) на
+    индексах плана, повторенных factor раз в отдельных модулях.
+    """
+    rup_data = parse_plan(filename)
+    indices_by_module = collect_indices(rup_data)
+    validator = get_index_validator(rup_data.get("qualification"))
+
+    results = []
+    for factor in factors:
+        replicated = {
+            (copy_number, module): indices
+            for copy_number in range(factor)
+            for module, indices in indices_by_module.items()
+        }
+        count = sum(len(indices) for indices in replicated.values())
+
+        start = time.perf_counter()
+        errors = validator.validate_plan(replicated)
+        elapsed = time.perf_counter() - start
+
+        results.append({
+            'factor': factor,
+            'indices': count,
+            'errors': sum(1 for module_errors in errors.values() for error in module_errors if error),
+            'seconds': round(elapsed, 5),
+            'us_per_index': round(elapsed / count * 1000000, 2),
+        })
+    return results
+
+
+def build_replicated_plan(filename: str, factor: int):
+    """Собирает план, в котором строки плана и их часы повторены factor раз."""
+    parser = RUP_parser(filename, streaming=True)
+    parser.get_elements_from_file(replicate_plan_strings(filename, factor))
+    parser.build_tree()
+    return parser.rup
+
+
+def measure_hour_validation(filename: str, factors=(1, 10, 100)):
+    """
+    Сравнивает проверку часов по одной дисциплине (validate_discipline_hours
+    на JSON-представлении) с векторной проверкой всего плана по матрице
+    часов (validate_plan_hours) при росте числа строк плана.
+    """
+    results = []
+    for factor in factors:
+        rup_data = build_replicated_plan(filename, factor)
+        plan_strings = collect_plan_strings(rup_data)
+        json_strings = collect_plan_strings(plan_to_json(rup_data))
+
+        start = time.perf_counter()
+        for kind, plan_string in json_strings:
+            validate_discipline_hours(plan_string)
+        per_string = time.perf_counter() - start
+
+        start = time.perf_counter()
+        warnings = validate_plan_hours(rup_data['hours'], plan_strings)
+        vectorized = time.perf_counter() - start
+
+        results.append({
+            'factor': factor,
+            'plan_strings': len(plan_strings),
+            'violations': sum(len(string_warnings) for string_warnings in warnings.values()),
+            'per_string_seconds': round(per_string, 5),
+            'vectorized_seconds': round(vectorized, 5),
+        })
+    return results
+
+
+def measure_plan_size(filename: str, factors=(1, 10, 100)):
+    """
+    Сравнивает промежуточный план с матрицей часов и его прежнее
+    JSON-представление: пиковую память сборки (tracemalloc) и размер
+    сериализованного плана (pickle, как при передаче из процессов пула).
+    """
+    results = []
+    for factor in factors:
+        elements = replicate_plan_strings(filename, factor)
+        parser = RUP_parser(filename, streaming=True)
+        parser.get_elements_from_file(elements)
+
+        tracemalloc.start()
+        parser.build_tree()
+        _, matrix_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        tracemalloc.start()
+        plan_json = plan_to_json(parser.rup)
+        _, json_peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        results.append({
+            'factor': factor,
+            'plan_strings': len(parser.hours.string_ids),
+            'matrix_peak_mb': round(matrix_peak / 1024 / 1024, 2),
+            'json_peak_mb': round(json_peak / 1024 / 1024, 2),
+            'matrix_pickle_kb': round(len(pickle.dumps(parser.rup)) / 1024, 1),
+            'json_pickle_kb': round(len(pickle.dumps(plan_json)) / 1024, 1),
+        })
+    return results
+
+
+def run_pipeline(plan_file: str, profiler: StageProfiler, speller, export_path: str):
+    """
+    Выполняет весь импорт файла плана по этапам profiler с теми же именами,
+    что и runparser --profile: разбор, сборка дерева, проверка орфографии
+    бэкендом speller, запись в БД (с очисткой таблиц планов) и выгрузка
+    models_to_json в export_path.
+    """
+    with profiler.stage('get_elements_from_file') as stage:
+        parser = RUP_parser(plan_file)
+        parser.get_elements_from_file()
+        stage['items'] = len(parser.plany_stroky) + len(parser.plany_stroky_childs) + len(parser.plany_novie_chasy)
+    with profiler.stage('build_tree') as stage:
+        parser.build_tree()
+        rup_data = parser.rup
+        stage['items'] = len(parser.hours.string_ids)
+    with profiler.stage('validation') as stage:
+        texts = collect_texts(rup_data)
+        text_warnings = validate_texts(texts, speller)
+        stage['items'] = len(texts)
+    with profiler.stage('load_json_to_models') as stage:
+        objects = load_json_to_models_bulk(rup_data, text_warnings=text_warnings)
+        stage['items'] = sum(len(model_objects) for model_objects in objects.values())
+    with profiler.stage('models_to_json') as stage:
+        stage['items'] = models_to_json(export_path)
+    return rup_data
+
+
+def measure_pipeline(filename: str, scales=(1, 10, 100), speller_name='autocorrect'):
+    """
+    Прогоняет весь импорт (run_pipeline) с офлайн-бэкендом орфографии на
+    синтетических планах в scales раз больше filename. Каждый масштаб
+    выполняется в транзакции, которая откатывается, поэтому таблицы планов
+    и кеш орфографии в БД после замера не меняются, а замеры сравнимы между
+    запусками. Кеш планов на время замера подменяется BENCHMARK_PLAN_CACHE.
+    Возвращает этапы StageProfiler с полем scale.
+    """
+    base_size = plan_size(filename)
+    speller = get_speller(speller_name)
+
+    results = []
+    plan_cache_settings = override_settings(CACHES={**settings.CACHES, PLAN_CACHE_ALIAS: BENCHMARK_PLAN_CACHE})
+    with tempfile.TemporaryDirectory() as directory, plan_cache_settings:
+        for scale in scales:
+            plan_file = os.path.join(directory, f"synthetic-{scale}x.plx")
+            generate_plx(plan_file, **{name: count * scale for name, count in base_size.items()})
+            spell_cache.clear()
+
+            profiler = StageProfiler()
+            with transaction.atomic(), contextlib.redirect_stdout(io.StringIO()):
+                run_pipeline(plan_file, profiler, speller, os.path.join(directory, "exported_plan.json"))
+                transaction.set_rollback(True)
+
+            results.extend({'scale': scale, **record} for record in profiler.report()['stages'])
+    return results
+
+
+def current_commit():
+    """Короткий хеш текущего коммита или None вне git."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def benchmark_report(suite: str, filename: str, results):
+    """Оборачивает результаты набора в отчет с коммитом и окружением для сравнения между коммитами."""
+    return {
+        'suite': suite,
+        'file': filename,
+        'commit': current_commit(),
+        'created': timezone.now().isoformat(),
+        'python': platform.python_version(),
+        'results': results,
+    }
+
+
+# Поля, по которым сопоставляются записи отчетов; остальные числовые поля - метрики
+REPORT_KEYS = ('scale', 'factor', 'stage', 'mode', 'loader', 'backend')
+
+
+def compare_reports(current, baseline):
+    """
+    Сравнивает результаты двух отчетов одного набора: записи сопоставляются
+    по REPORT_KEYS, сравниваются все числовые поля.
+    Возвращает список {ключи записи, metric, baseline, current, ratio}.
+    """
+    def split(record):
+        key = tuple((name, record[name]) for name in REPORT_KEYS if name in record)
+        metrics = {
+            name: value for name, value in record.items()
+            if name not in REPORT_KEYS and isinstance(value, (int, float)) and not isinstance(value, bool)
+        }
+        return key, metrics
+
+    baseline_metrics = dict(map(split, baseline['results']))
+    comparison = []
+    for record in current['results']:
+        key, metrics = split(record)
+        for metric, value in metrics.items():
+            previous = baseline_metrics.get(key, {}).get(metric)
+            if previous is None:
+                continue
+            comparison.append({
+                **dict(key),
+                'metric': metric,
+                'baseline': previous,
+                'current': value,
+                'ratio': round(value / previous, 2) if previous else None,
+            })
+    return comparison
@@ -0,0 +1,163 @@
+import uuid
+
+import numpy as np
+
+# Итоговая ячейка семестра; остальные виды работ - ее составляющие
+TOTAL_TYPE_OF_WORK = 'Итого часов'
+
+
+def random_id(*parts):
+    """id узла по умолчанию для JSON-представления: случайный uuid4."""
+    return str(uuid.uuid4())
+
+
+class HourMatrix:
+    """
+    Часы всех строк плана: плотный массив counts
+    (строка, курс, семестр, вид работы) и небольшие таблицы к нему -
+    виды работ по последней оси, id и коды строк по первой, id непустых
+    ячеек. Курсы и семестры в методах нумеруются с 1, как в XML.
+    Размер сетки задается заголовком плана и расширяется при freeze(),
+    если часы выходят за него.
+    """
+
+    def __init__(self, work_types, courses: int, terms: int, hours_type: str):
+        # Итог первым, остальные виды работ по алфавиту
+        self.work_types = tuple(sorted(work_types, key=lambda work: (work != TOTAL_TYPE_OF_WORK, work)))
+        self.work_type_index = {work: index for index, work in enumerate(self.work_types)}
+        self.courses = courses
+        self.terms = terms
+        self.hours_type = hours_type
+
+        self.string_ids = []
+        self.string_codes = []
+        self.rows = {}
+        self.counts = np.zeros((0, courses, terms, len(self.work_types)), dtype=np.int32)
+        # Непустые ячейки: плоские индексы в counts (по возрастанию) и их id (16 байт uuid)
+        self.cell_positions = np.zeros(0, dtype=np.int64)
+        self.cell_ids = np.zeros((0, 16), dtype=np.uint8)
+        self._cells = []
+        self._cell_ids = []
+
+    def add_string(self, string_id, string_code):
+        """Добавляет строку плана и возвращает номер ее строки в массиве."""
+        row = len(self.string_ids)
+        self.string_ids.append(string_id)
+        self.string_codes.append(string_code)
+        self.rows[string_id] = row
+        return row
+
+    def add_cell(self, row, course, term, code_of_type_work, count_of_clocks, cell_id):
+        """
+        Запоминает ячейку часов; в массив она попадает при freeze().
+        Ячейки с одинаковыми строкой, курсом, семестром и видом работы
+        суммируются, id остается у первой.
+        """
+        self._cells.append((row, course - 1, term - 1, self.work_type_index[code_of_type_work], count_of_clocks))
+        self._cell_ids.append(uuid.UUID(cell_id).bytes)
+
+    def freeze(self):
+        """Собирает накопленные ячейки в массив counts и таблицу id ячеек."""
+        cells = np.array(self._cells, dtype=np.int64).reshape(-1, 5)
+        if len(cells):
+            self.courses = max(self.courses, int(cells[:, 1].max()) + 1)
+            self.terms = max(self.terms, int(cells[:, 2].max()) + 1)
+        shape = (len(self.string_ids), self.courses, self.terms, len(self.work_types))
+        flat = np.ravel_multi_index(tuple(cells[:, :4].T), shape)
+        counts = np.bincount(flat, weights=cells[:, 4], minlength=int(np.prod(shape)))
+        self.counts = counts.astype(np.int32).reshape(shape)
+
+        self.cell_positions, first = np.unique(flat, return_index=True)
+        self.cell_ids = np.frombuffer(b''.join(self._cell_ids), dtype=np.uint8).reshape(-1, 16)[first]
+        self._cells = []
+        self._cell_ids = []
+        return self
+
+    def cells(self, string_id):
+        """Отдает непустые ячейки строки плана в виде словарей clock_cells."""
+        row = self.rows[string_id]
+        row_size = self.courses * self.terms * len(self.work_types)
+        start, stop = np.searchsorted(self.cell_positions, (row * row_size, (row + 1) * row_size))
+        counts = self.counts.reshape(-1)
+        for position, cell_id in zip(self.cell_positions[start:stop], self.cell_ids[start:stop]):
+            _, course, term, work = np.unravel_index(position, self.counts.shape)
+            yield {
+                'id': str(uuid.UUID(bytes=cell_id.tobytes())),
+                'code_of_type_work': self.work_types[work],
+                'code_of_type_hours': self.hours_type,
+                'course': int(course) + 1,
+                'term': int(term) + 1,
+                'count_of_clocks': int(counts[position]),
+                'parent_string_id': string_id,
+            }
+
+    def courses_json(self, string_id, make_id=random_id):
+        """
+        Ячейки строки в JSON-виде: курсы -> семестры -> clock_cells.
+        Курс и семестр появляются, только если в них есть часы.
+        """
+        string_code = self.string_codes[self.rows[string_id]]
+        courses = {}
+        terms = {}
+        for clock in self.cells(string_id):
+            course, term = clock['course'], clock['term']
+            if course not in courses:
+                courses[course] = {
+                    'id': make_id('course', string_code, course),
+                    'course_number': course,
+                    'terms': [],
+                }
+            if (course, term) not in terms:
+                terms[course, term] = {
+                    'id': make_id('term', string_code, course, term),
+                    'term_number': term,
+                    'clock_cells': [],
+                }
+                courses[course]['terms'].append(terms[course, term])
+            terms[course, term]['clock_cells'].append(clock)
+        return list(courses.values())
+
+
+def plan_to_json(rup_data, make_id=random_id):
+    """
+    Возвращает копию плана в прежнем JSON-виде: у каждой строки плана
+    список clock_cells по курсам и семестрам, без матрицы часов.
+    """
+    hours = rup_data['hours']
+
+    def with_cells(plan_string):
+        expanded = dict(plan_string, clock_cells=hours.courses_json(plan_string['id'], make_id))
+        if 'children_strings' in plan_string:
+            expanded['children_strings'] = [with_cells(child_plan) for child_plan in plan_string['children_strings']]
+        return expanded
+
+    plan = {key: value for key, value in rup_data.items() if key != 'hours'}
+    plan['stady_plan'] = [
+        dict(cycle, children=[
+            dict(child, plans_of_string=[with_cells(plan_string) for plan_string in child['plans_of_string']])
+            for child in cycle['children']
+        ])
+        for cycle in rup_data.get('stady_plan', [])
+    ]
+    return plan
+
+
+def hour_violations(hours: HourMatrix):
+    """
+    Находит все семестры, где сумма часов по видам работ не совпадает с
+    итоговой ячейкой. Возвращает список
+    {'row', 'course', 'term', 'components', 'total'} в порядке строк плана.
+    """
+    totals = hours.counts[..., hours.work_type_index[TOTAL_TYPE_OF_WORK]]
+    components = hours.counts.sum(axis=-1, dtype=np.int64) - totals
+    rows, courses, terms = np.nonzero(totals != components)
+    return [
+        {
+            'row': int(row),
+            'course': int(course) + 1,
+            'term': int(term) + 1,
+            'components': int(components[row, course, term]),
+            'total': int(totals[row, course, term]),
+        }
+        for row, course, term in zip(rows, courses, terms)
+    ]
@@ -1,86 +1,86 @@
 from parserapp.parser import RUP_parser
 from parserapp.models_loader import load_json_to_models
 from parserapp.models import StudyPlan, Category, StudyCycle, Module, Disipline, ClockCell
+from parserapp.plan_cache import PLAN_CACHE_CHUNK_SIZE, cached_plan_dicts, plan_chunks, plan_versions
 import json
+import textwrap
+from pathlib import Path
 
-def models_to_json():
+# Планов в одной пачке экспорта: на пачку приходится постоянное число запросов
+EXPORT_CHUNK_SIZE = PLAN_CACHE_CHUNK_SIZE
+
+
+def export_queryset(plan_ids=None, changed_since=None):
+    """
+    Версии планов для выгрузки: все, только с id из plan_ids и/или только
+    записанные в БД позже changed_since (по StudyPlan.updated_at).
+    """
+    queryset = plan_versions(plan_ids or None)
+    if changed_since is not None:
+        queryset = queryset.filter(updated_at__gt=changed_since)
+    return queryset
+
+
+def export_plan_dicts(chunk_size=EXPORT_CHUNK_SIZE, plan_ids=None, changed_since=None):
+    """
+    Отдает деревья выгружаемых планов по одному. Деревья берутся из кеша
+    планов, промахи пачки сериализуются по запросу на уровень дерева.
+    """
+    for chunk in plan_chunks(export_queryset(plan_ids, changed_since), chunk_size):
+        plan_dicts = cached_plan_dicts(chunk)
+        for plan in chunk:
+            yield plan_dicts[plan.id]
+
+
+def plan_json(plan_dict, indent=4):
+    """JSON-текст одного плана; indent=None - компактный вывод."""
+    separators = None if indent is not None else (",", ":")
+    return json.dumps(plan_dict, ensure_ascii=False, indent=indent, separators=separators)
+
+
+def models_to_json(path="exported_plan.json", indent=4, chunk_size=EXPORT_CHUNK_SIZE, plan_ids=None,
+                   changed_since=None):
     """
     Сериализует объекты моделей Django обратно в JSON-структуру,
-    аналогичную исходному формату, и сохраняет её в файл exported_plan.json.
+    аналогичную исходному формату, и сохраняет её в файл path.
+    Планы читаются пачками по chunk_size (на пачку - постоянное число
+    запросов, деревья из кеша планов не запрашиваются) и пишутся в
+    JSON-массив по одному, поэтому в памяти держится только текущая пачка.
+    indent=None - компактный вывод.
+    plan_ids и changed_since ограничивают выгрузку (см. export_queryset).
+    Возвращает число выгруженных планов.
+    """
+    exported = 0
+    with open(path, "w", encoding="utf-8") as f:
+        f.write("[")
+        for plan_dict in export_plan_dicts(chunk_size, plan_ids, changed_since):
+            text = plan_json(plan_dict, indent)
+            if indent is not None:
+                # Элемент массива сдвигается на уровень, как у json.dump всего списка
+                text = "\n" + textwrap.indent(text, " " * indent)
+            f.write(("," if exported else "") + text)
+            exported += 1
+        f.write("\n]" if indent is not None and exported else "]")
+    print(f"Данные сохранены в {path}")
+    return exported
+
+
+def models_to_json_files(directory, indent=4, chunk_size=EXPORT_CHUNK_SIZE, plan_ids=None, changed_since=None):
     """
-    result = []
-
-    for study_plan in StudyPlan.objects.all():
-        study_plan_dict = {
-            "id": str(study_plan.id),
-            "specialization_code": study_plan.specialization_code,
-            "name": study_plan.name,
-            "create_date": str(study_plan.create_date),
-            "gos_type": study_plan.gos_type,
-            "stady_plan": []
-        }
-        for category in study_plan.cycles.all():
-            category_dict = {
-                "id": str(category.id),
-                "identificator": category.identificator,
-                "cycles": category.cycles,
-                "children": []
-            }
-            for study_cycle in category.child_cycles.all():
-                study_cycle_dict = {
-                    "id": str(study_cycle.id),
-                    "identificator": study_cycle.identificator,
-                    "cycles": study_cycle.cycles,
-                    "parent_id": str(study_cycle.category.id),
-                    "plans_of_string": []
-                }
-                for module in study_cycle.plan_strings.all():
-                    module_dict = {
-                        "id": str(module.id),
-                        "discipline": module.name,
-                        "code_of_cycle_block": str(study_cycle.id),
-                        "clock_cells": [],
-                        "children_strings": []
-                    }
-                    # Clock cells, прикрепленные к StudyCycle (от модуля)
-                    for clock in module.clock_cells.all():
-                        module_dict["clock_cells"].append({
-                            "id": str(clock.id),
-                            "code_of_type_work": clock.code_of_type_work,
-                            "code_of_type_hours": clock.code_of_type_hours,
-                            "course": clock.course,
-                            "term": clock.semestr,
-                            "count_of_clocks": clock.count_of_clocks,
-                            "parent_string_id": str(module.id)
-                        })
-                    for disipline in module.child_plan_strings.all():
-                        disipline_dict = {
-                            "id": str(disipline.id),
-                            "discipline": disipline.name,
-                            "code_of_cycle_block": str(study_cycle.id),
-                            "parent_string_id": str(module.id),
-                            "clock_cells": []
-                        }
-                        for clock in disipline.clock_cells.all():
-                            disipline_dict["clock_cells"].append({
-                                "id": str(clock.id),
-                                "code_of_type_work": clock.code_of_type_work,
-                                "code_of_type_hours": clock.code_of_type_hours,
-                                "course": clock.course,
-                                "term": clock.semestr,
-                                "count_of_clocks": clock.count_of_clocks,
-                                "parent_string_id": str(disipline.id)
-                            })
-                        module_dict["children_strings"].append(disipline_dict)
-                    study_cycle_dict["plans_of_string"].append(module_dict)
-                category_dict["children"].append(study_cycle_dict)
-            study_plan_dict["stady_plan"].append(category_dict)
-        result.append(study_plan_dict)
-
-    with open("exported_plan.json", "w", encoding="utf-8") as f:
-        json.dump(result, f, ensure_ascii=False, indent=4)
-    print("Данные сохранены в exported_plan.json")
-    return result
+    Выгружает каждый план в отдельный файл <id плана>.json в каталоге
+    directory, чтобы синхронизация переносила только изменившиеся планы.
+    Фильтры те же, что у models_to_json. Возвращает список записанных файлов.
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for plan_dict in export_plan_dicts(chunk_size, plan_ids, changed_since):
+        path = directory / f"{plan_dict['id']}.json"
+        path.write_text(plan_json(plan_dict, indent), encoding="utf-8")
+        paths.append(path)
+    print(f"Планов сохранено в {directory}: {len(paths)}")
+    return paths
+
 
 if __name__ == "__main__":
     # 1. Парсим XML и сохраняем в JSON
@@ -112,8 +112,7 @@ if __name__ == "__main__":
         print(clock)
 
     # 4. Сериализуем модели обратно в JSON и сохраняем в файл
-    restored_json = models_to_json()
-    with open("restored_plan.json", "w", encoding="utf-8") as f:
-        json.dump(restored_json, f, ensure_ascii=False, indent=4)
+    models_to_json("restored_plan.json")
     print("=== Restored JSON from models ===")
-    print(json.dumps(restored_json, ensure_ascii=False, indent=4))
\ No newline at end of file
+    with open("restored_plan.json", encoding="utf-8") as f:
+        print(f.read())
\ No newline at end of file
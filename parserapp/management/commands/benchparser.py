@@ -0,0 +1,74 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from parserapp.benchmarks import (
+    measure_parse, measure_build_scaling, measure_loaders, measure_spellers, measure_index_validation,
+    measure_hour_validation, measure_plan_size, measure_pipeline, benchmark_report, compare_reports
+)
+
+
+class Command(BaseCommand):
+    help = "Замеряет производительность этапов парсера и выводит результаты в JSON"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'suite',
+            choices=['memory', 'build', 'loader', 'speller', 'index', 'hours', 'size', 'pipeline'],
+            help='Набор замеров',
+        )
+        parser.add_argument(
+            '--file',
+            default='gg.plx',
+            help='Файл плана (.plx) для замеров',
+        )
+        parser.add_argument(
+            '--output',
+            help='Сохранить отчет (результаты, коммит, окружение) в JSON-файл',
+        )
+        parser.add_argument(
+            '--compare',
+            help='Сравнить результаты с ранее сохраненным отчетом (--output) того же набора',
+        )
+
+    def handle(self, *args, **kwargs):
+        suite = kwargs['suite']
+        filename = kwargs['file']
+
+        if suite == 'memory':
+            # Сравнение пиковой памяти полного дерева и потокового режима
+            results = [measure_parse(filename, streaming) for streaming in (False, True)]
+        elif suite == 'build':
+            # Рост времени сборки дерева при увеличении числа строк плана
+            results = measure_build_scaling(filename)
+        elif suite == 'loader':
+            # Построчная и пакетная запись плана в БД (очищает таблицы планов!)
+            results = measure_loaders(filename)
+        elif suite == 'speller':
+            # Время проверки орфографии названий плана каждым бэкендом
+            results = measure_spellers(filename)
+        elif suite == 'index':
+            # Пакетная проверка индексов дисциплин
+            results = measure_index_validation(filename)
+        elif suite == 'hours':
+            # Проверка часов: по дисциплинам и векторная по всему плану
+            results = measure_hour_validation(filename)
+        elif suite == 'size':
+            # Матрица часов против прежнего JSON-представления плана
+            results = measure_plan_size(filename)
+        elif suite == 'pipeline':
+            # Весь импорт на синтетических планах 1x, 10x и 100x от размера --file
+            results = measure_pipeline(filename)
+
+        report = benchmark_report(suite, filename, results)
+        if kwargs['output']:
+            with open(kwargs['output'], "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=4)
+
+        if kwargs['compare']:
+            with open(kwargs['compare'], encoding="utf-8") as file:
+                baseline = json.load(file)
+            if baseline.get('suite') != suite:
+                raise CommandError(f"Отчет {kwargs['compare']} относится к набору '{baseline.get('suite')}'")
+            results = compare_reports(report, baseline)
+
+        self.stdout.write(json.dumps(results, ensure_ascii=False, indent=4))
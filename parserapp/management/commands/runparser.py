@@ -1,69 +1,509 @@
 import json
+from datetime import datetime, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
 
-from django.core.management.base import BaseCommand
-from parserapp.parser import RUP_parser
-from parserapp.models_loader import load_json_to_models
-from parserapp.main import models_to_json
-from parserapp.models import StudyPlan, Category, StudyCycle, Module, Disipline, ClockCell, WhitelistWord
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from parserapp.parser import RUP_parser, parse_plan, file_fingerprint
+from parserapp.models_loader import (
+    load_json_to_models_bulk, upsert_json_to_models, clear_models, imported_fingerprints, collect_texts,
+    DEFAULT_BATCH_SIZE
+)
+from parserapp.main import models_to_json, models_to_json_files
+from parserapp.plan_cache import warm_plan_cache
+from parserapp.validators import (
+    evict_spell_cache, validate_texts, validation_fingerprint, whitelist_cache, add_to_whitelist, read_whitelist_file,
+    write_whitelist_file
+)
+from parserapp.models import StudyPlan, Category, StudyCycle, Module, Disipline, ClockCell
+from parserapp.profiling import StageProfiler
+
+# Этапы импорта, которые замеряет --profile
+PROFILE_STAGES = [
+    'get_elements_from_file', 'build_tree', 'parse_plan', 'validation', 'load_json_to_models', 'models_to_json',
+    'warm_plan_cache', 'print_model_data',
+]
+
+# Уровни дерева в отчете print_model_data и связи, по которым спускается отчет
+REPORT_LEVELS = ('plan', 'category', 'cycle', 'module', 'discipline', 'clock_cell')
+REPORT_CHILDREN = ('cycles', 'child_cycles', 'plan_strings', 'child_plan_strings', 'clock_cells')
 
 
 class Command(BaseCommand):
     help = "Парсит XML, загружает данные в БД, экспортирует в JSON и выводит данные"
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            'paths',
+            nargs='*',
+            type=str,
+            help='Файлы .plx или каталоги с ними. Без аргументов разбирается gg.plx',
+        )
+        parser.add_argument(
+            '--jobs',
+            type=int,
+            default=1,
+            help='Число процессов для параллельного разбора файлов',
+        )
+        parser.add_argument(
+            '--stable_ids',
+            action='store_true',
+            help='Детерминированные id узлов плана вместо случайных uuid4',
+        )
+        parser.add_argument(
+            '--batch_size',
+            type=int,
+            default=DEFAULT_BATCH_SIZE,
+            help='Размер пачки INSERT при записи плана в БД',
+        )
+        parser.add_argument(
+            '--incremental',
+            action='store_true',
+            help='Обновлять только изменившиеся строки плана, не очищая БД. Неизменившиеся планы сохраняют '
+                 'id и updated_at (а значит, и ETag API); полная перезагрузка переписывает все планы',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Загружать планы, даже если файлы не изменились с последнего импорта',
+        )
         parser.add_argument(
             '--add_to_whitelist',
             nargs='+',
             type=str,
             help='Добавить слова в вайтлист',
         )
+        parser.add_argument(
+            '--import_whitelist',
+            type=str,
+            help='Добавить в вайтлист слова из текстового файла (по одному на строку)',
+        )
+        parser.add_argument(
+            '--export_whitelist',
+            type=str,
+            help='Выгрузить вайтлист в текстовый файл',
+        )
+        parser.add_argument(
+            '--streaming',
+            action='store_true',
+            help='Читать .plx потоково, не строя полное XML-дерево',
+        )
+        parser.add_argument(
+            '--export',
+            action='store_true',
+            help='Выгрузить загруженные планы в exported_plan.json (models_to_json)',
+        )
+        parser.add_argument(
+            '--export_compact',
+            action='store_true',
+            help='Выгружать JSON без отступов (вместе с --export)',
+        )
+        parser.add_argument(
+            '--export_plans',
+            nargs='+',
+            type=str,
+            help='Выгрузить только планы с указанными id (включает --export)',
+        )
+        parser.add_argument(
+            '--export_changed_since',
+            type=str,
+            help='Выгрузить только планы, записанные в БД после даты/времени ISO 8601 (включает --export '
+                 'и --incremental: при полной перезагрузке все планы считались бы измененными)',
+        )
+        parser.add_argument(
+            '--export_dir',
+            type=str,
+            help='Выгружать каждый план в отдельный файл <id>.json в каталоге (включает --export)',
+        )
+        parser.add_argument(
+            '--report_plan',
+            type=str,
+            help='Вывести после загрузки только план с указанным id',
+        )
+        parser.add_argument(
+            '--report_depth',
+            type=int,
+            choices=range(1, len(REPORT_LEVELS) + 1),
+            default=len(REPORT_LEVELS),
+            help='Глубина отчета: 1 - только планы, ..., 6 - вплоть до ячеек часов',
+        )
+        parser.add_argument(
+            '--report_warnings_only',
+            action='store_true',
+            help='Выводить в отчете только сущности с предупреждениями (и их предков)',
+        )
+        parser.add_argument(
+            '--report_summary',
+            action='store_true',
+            help='Вывести вместо дерева число объектов каждой модели',
+        )
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Замерить этапы импорта (время, CPU, пик памяти, число элементов) и вывести сводку в JSON',
+        )
+        parser.add_argument(
+            '--queries',
+            action='store_true',
+            help='Вывести число и время SQL-запросов по этапам импорта',
+        )
+        parser.add_argument(
+            '--profile_output',
+            type=str,
+            help='Файл для JSON-сводки --profile (по умолчанию вывод в консоль)',
+        )
+        parser.add_argument(
+            '--cprofile_stage',
+            choices=PROFILE_STAGES,
+            help='Этап, для которого сохраняется статистика cProfile (вместе с --profile)',
+        )
+        parser.add_argument(
+            '--cprofile_output',
+            type=str,
+            help='Файл статистики cProfile (по умолчанию <этап>.prof)',
+        )
 
     def handle(self, *args, **kwargs):
-        add_to_whitelist = kwargs['add_to_whitelist']
-        if add_to_whitelist:
-            for word in add_to_whitelist:
-                WhitelistWord.objects.get_or_create(word=word.lower())
-            self.stdout.write(self.style.SUCCESS(f"Слова '{', '.join(add_to_whitelist)}' добавлены в вайтлист"))
+        words_to_whitelist = kwargs['add_to_whitelist']
+        if words_to_whitelist:
+            add_to_whitelist(words_to_whitelist)
+            self.stdout.write(self.style.SUCCESS(f"Слова '{', '.join(words_to_whitelist)}' добавлены в вайтлист"))
+            return
+
+        if kwargs['import_whitelist']:
+            words = read_whitelist_file(kwargs['import_whitelist'])
+            added = add_to_whitelist(words)
+            self.stdout.write(self.style.SUCCESS(
+                f"Из {kwargs['import_whitelist']} прочитано слов: {len(words)}, добавлено новых: {added}"
+            ))
+            return
+
+        if kwargs['export_whitelist']:
+            exported = write_whitelist_file(kwargs['export_whitelist'])
+            self.stdout.write(self.style.SUCCESS(f"В {kwargs['export_whitelist']} выгружено слов: {exported}"))
             return
 
         self.stdout.write(self.style.WARNING("Запуск парсера..."))
 
+        self.batch_size = kwargs['batch_size']
+        # Полная перезагрузка обновляет updated_at всех планов, поэтому выгрузка
+        # изменившихся планов работает только с инкрементальной загрузкой
+        self.incremental = kwargs['incremental'] or bool(kwargs['export_changed_since'])
+        self.force = kwargs['force']
+        self.export_indent = None if kwargs['export_compact'] else 4
+        self.export_plan_ids = kwargs['export_plans']
+        self.export_changed_since = self.parse_changed_since(kwargs['export_changed_since'])
+        self.export_dir = kwargs['export_dir']
+        self.export = kwargs['export'] or bool(
+            self.export_plan_ids or self.export_changed_since or self.export_dir
+        )
+        self.report_options = {
+            'plan_id': kwargs['report_plan'],
+            'depth': kwargs['report_depth'],
+            'warnings_only': kwargs['report_warnings_only'],
+            'summary': kwargs['report_summary'],
+        }
+        self.profiler = StageProfiler(
+            enabled=kwargs['profile'] or kwargs['queries'],
+            cprofile_stage=kwargs['cprofile_stage'],
+            cprofile_path=kwargs['cprofile_output'],
+        )
+
+        plan_files = self.collect_plan_files(kwargs['paths']) if kwargs['paths'] else ["gg.plx"]
+        fingerprints = {plan_file: file_fingerprint(plan_file) for plan_file in plan_files}
+        self.validation_hash = validation_fingerprint()
+        plan_files = self.select_changed(fingerprints)
+        if not plan_files:
+            self.stdout.write(self.style.SUCCESS("Файлы планов не изменились с последнего импорта, загрузка пропущена"))
+            self.export_plans()
+            return
+
+        if kwargs['paths']:
+            self.load_batch(plan_files, fingerprints, kwargs['jobs'], kwargs['streaming'], kwargs['stable_ids'])
+            evict_spell_cache()
+            self.report_whitelist_queries()
+            self.export_plans()
+            with self.profiler.stage('print_model_data'):
+                self.print_model_data(**self.report_options)
+            self.report_queries(kwargs['queries'])
+            self.report_profile(kwargs['profile'], kwargs['profile_output'])
+            self.stdout.write(self.style.SUCCESS("Парсер успешно завершил работу!"))
+            return
+
         # 1. Парсим XML и загружаем в JSON
-        parser = RUP_parser()
-        plan_data = parser.get_plan()
+        with self.profiler.stage('get_elements_from_file') as stage:
+            # Без --streaming XML-дерево строится в конструкторе, поэтому он входит в этап
+            parser = RUP_parser(streaming=kwargs['streaming'], stable_ids=kwargs['stable_ids'])
+            parser.get_elements_from_file()
+            stage['items'] = len(parser.plany_stroky) + len(parser.plany_stroky_childs) + len(parser.plany_novie_chasy)
+        with self.profiler.stage('build_tree') as stage:
+            parser.build_tree()
+            stage['items'] = len(parser.hours.string_ids)
+        parser.save_plan()
         rup_data = parser.rup  # Получаем словарь rup
+        rup_data['source_hash'] = fingerprints[parser.filename]
+        rup_data['validation_hash'] = self.validation_hash
         self.stdout.write(self.style.SUCCESS("Данные успешно загружены из XML"))
 
-        # 2. Загрузка JSON-данных в БД
-        load_json_to_models(rup_data)  # Передаем rup_data
+        # 2. Проверка орфографии и загрузка JSON-данных в БД
+        with self.profiler.stage('validation') as stage:
+            texts = collect_texts(rup_data)
+            text_warnings = validate_texts(texts)
+            stage['items'] = len(texts)
+        with self.profiler.stage('load_json_to_models') as stage:
+            stage['items'] = self.store_plan(rup_data, text_warnings=text_warnings)
+        evict_spell_cache()
+        self.report_whitelist_queries()
         self.stdout.write(self.style.SUCCESS("Данные успешно загружены в базу"))
+        self.export_plans()
 
         # 3. Вывод содержимого моделей в консоль (с информацией о предупреждениях)
-        self.print_model_data()
+        with self.profiler.stage('print_model_data'):
+            self.print_model_data(**self.report_options)
 
+        self.report_queries(kwargs['queries'])
+        self.report_profile(kwargs['profile'], kwargs['profile_output'])
         self.stdout.write(self.style.SUCCESS("Парсер успешно завершил работу!"))
 
-    def print_model_data(self):
-        """Выводит содержимое моделей, включая информацию о предупреждениях."""
+    def parse_changed_since(self, value):
+        """Разбирает --export_changed_since; время без пояса считается в TIME_ZONE."""
+        if not value:
+            return None
+        changed_since = parse_datetime(value)
+        if changed_since is None:
+            changed_date = parse_date(value)
+            if changed_date is None:
+                raise CommandError(f"Неверная дата в --export_changed_since: '{value}'")
+            changed_since = datetime.combine(changed_date, time.min)
+        if timezone.is_naive(changed_since):
+            changed_since = timezone.make_aware(changed_since)
+        return changed_since
+
+    def export_plans(self):
+        """
+        Выгружает загруженные планы (--export) в exported_plan.json или
+        по файлу на план (--export_dir), с фильтрами --export_plans и
+        --export_changed_since.
+        """
+        if not self.export:
+            return
+        filters = {
+            'indent': self.export_indent,
+            'plan_ids': self.export_plan_ids,
+            'changed_since': self.export_changed_since,
+        }
+        with self.profiler.stage('models_to_json') as stage:
+            if self.export_dir:
+                stage['items'] = len(models_to_json_files(self.export_dir, **filters))
+            else:
+                stage['items'] = models_to_json(**filters)
+
+    def report_queries(self, enabled):
+        """Выводит число и время SQL-запросов по этапам (--queries)."""
+        if not enabled:
+            return
+        self.stdout.write("\n=== SQL-запросы по этапам ===")
+        for stage in self.profiler.stages:
+            self.stdout.write(f"{stage['stage']}: запросов {stage['queries']}, {stage['query_seconds']} с")
+
+    def report_profile(self, enabled, profile_output=None):
+        """Выводит JSON-сводку --profile в консоль или в файл."""
+        if not enabled:
+            return
+        report = json.dumps(self.profiler.report(), ensure_ascii=False, indent=4)
+        if profile_output:
+            with open(profile_output, "w", encoding="utf-8") as file:
+                file.write(report)
+            self.stdout.write(self.style.SUCCESS(f"Сводка профилирования сохранена в {profile_output}"))
+        else:
+            self.stdout.write(report)
+
+    def report_whitelist_queries(self):
+        """Выводит число запросов к вайтлисту за импорт (ожидается не больше одного)."""
+        self.stdout.write(f"Запросов к вайтлисту за импорт: {whitelist_cache.queries}")
+
+    def collect_plan_files(self, paths):
+        """Раскрывает каталоги в список файлов .plx."""
+        plan_files = []
+        for path in map(Path, paths):
+            if path.is_dir():
+                plan_files.extend(sorted(path.glob('*.plx')))
+            elif path.is_file():
+                plan_files.append(path)
+            else:
+                raise CommandError(f"Файл или каталог '{path}' не найден")
+
+        if not plan_files:
+            raise CommandError("Не найдено ни одного файла .plx")
+        return [str(plan_file) for plan_file in plan_files]
+
+    def select_changed(self, fingerprints):
+        """
+        Отбирает файлы, которые нужно загрузить: с --force все, иначе те,
+        чей хеш еще не загружен текущей версией импорта с текущими бэкендом
+        орфографии и вайтлистом (после их смены планы проверяются заново).
+        Полная (не инкрементальная) загрузка очищает БД, поэтому при любом
+        изменении перечитываются все файлы.
+        """
+        if self.force:
+            return list(fingerprints)
+
+        imported = imported_fingerprints(fingerprints.values(), self.validation_hash)
+        changed = [plan_file for plan_file, source_hash in fingerprints.items() if source_hash not in imported]
+        if changed and not self.incremental:
+            return list(fingerprints)
+        return changed
+
+    def store_plan(self, rup_data, clear=True, text_warnings=None):
+        """
+        Записывает план в БД полной перезаливкой или инкрементально (--incremental).
+        Возвращает число записанных (добавленных, обновленных и удаленных) строк.
+        """
+        if not self.incremental:
+            objects = load_json_to_models_bulk(
+                rup_data, clear=clear, batch_size=self.batch_size, text_warnings=text_warnings
+            )
+            return sum(len(model_objects) for model_objects in objects.values())
+
+        stats = upsert_json_to_models(rup_data, batch_size=self.batch_size, text_warnings=text_warnings)
+        for model_name, counts in stats.items():
+            self.stdout.write(
+                f"{model_name}: добавлено {counts['inserted']}, "
+                f"обновлено {counts['updated']}, удалено {counts['deleted']}"
+            )
+        return sum(sum(counts.values()) for counts in stats.values())
+
+    def load_batch(self, plan_files, fingerprints, jobs, streaming, stable_ids):
+        """
+        Разбирает файлы в пуле процессов, проверяет орфографию уникальных
+        названий всех планов одним этапом и записывает планы в БД в текущем
+        процессе (единственный писатель). Разбор в пуле замеряется --profile
+        одним этапом parse_plan: память и CPU рабочих процессов в него не входят.
+        Если хоть один файл не разобран, команда завершается ошибкой до записи
+        в БД; очистка и запись всех планов идут в одной транзакции.
+        После загрузки прогревает кеш сериализованных планов.
+        """
+        parsed = {}
+        failed = []
+        with self.profiler.stage('parse_plan') as stage, ProcessPoolExecutor(max_workers=max(jobs, 1)) as executor:
+            futures = {
+                executor.submit(parse_plan, plan_file, streaming, stable_ids): plan_file
+                for plan_file in plan_files
+            }
+            for future in as_completed(futures):
+                plan_file = futures[future]
+                try:
+                    parsed[plan_file] = future.result()
+                except Exception as e:
+                    self.stderr.write(self.style.ERROR(f"Ошибка разбора {plan_file}: {e}"))
+                    failed.append(plan_file)
+            stage['items'] = len(parsed)
+
+        if failed:
+            raise CommandError(
+                f"Не удалось разобрать файлов: {len(failed)} ({', '.join(sorted(failed))}). БД не изменена"
+            )
+
+        with self.profiler.stage('validation') as stage:
+            texts = [text for rup_data in parsed.values() for text in collect_texts(rup_data)]
+            text_warnings = validate_texts(texts)
+            stage['items'] = len(texts)
+
+        with self.profiler.stage('load_json_to_models') as stage, transaction.atomic():
+            stage['items'] = 0
+            if not self.incremental:
+                clear_models()
+            for plan_file, rup_data in parsed.items():
+                rup_data['source_hash'] = fingerprints[plan_file]
+                rup_data['validation_hash'] = self.validation_hash
+                stage['items'] += self.store_plan(rup_data, clear=False, text_warnings=text_warnings)
+                self.stdout.write(self.style.SUCCESS(f"План из {plan_file} загружен в базу"))
+
+        # Деревья всех планов кладутся в кеш пачками; неизменившиеся уже там
+        with self.profiler.stage('warm_plan_cache') as stage:
+            stage['items'] = warm_plan_cache()
+
+        self.stdout.write(self.style.SUCCESS(f"Обработано файлов: {len(plan_files)}"))
+
+    def print_model_data(self, plan_id=None, depth=len(REPORT_LEVELS), warnings_only=False, summary=False):
+        """
+        Выводит содержимое моделей, включая информацию о предупреждениях.
+        Дерево читается из предзагрузки: по запросу на уровень до depth.
+        plan_id - только один план, warnings_only - только сущности с
+        предупреждениями и их предки, summary - вместо строк число объектов
+        каждой модели.
+        """
+        plans = StudyPlan.objects.all()
+        if plan_id:
+            plans = plans.filter(id=plan_id)
+
+        if summary:
+            self.print_model_summary(plans)
+            return
+
+        children = REPORT_CHILDREN[:depth - 1]
+        if children:
+            plans = plans.prefetch_related('__'.join(children))
         print("\n=== Учебные планы ===")
-        for sp in StudyPlan.objects.all():
-            print(
-                f"{sp.id} | Квалификация: {sp.qualification}, Год начала: {sp.admission_year}, Дата: {sp.create_date} | Warnings: {sp.warnings} | Description: {sp.warning_description or 'Нет'}")
-            for category in sp.cycles.all():
-                print(
-                    f"   └─ Категория: {category.id} | {category.identificator}: {category.cycles} | Warnings: {category.warnings} | Description: {category.warning_description or 'Нет'}")
-                for study_cycle in category.child_cycles.all():
-                    print(
-                        f"       └─ Учебный цикл: {study_cycle.id} | {study_cycle.identificator}: {study_cycle.cycles} | Warnings: {study_cycle.warnings} | Description: {study_cycle.warning_description or 'Нет'}")
-                    for module in study_cycle.plan_strings.all():
-                        print(
-                            f"           └─ Модуль: {module.id} | Дисциплина: {module.name} | Warnings: {module.warnings} | Description: {module.warning_description or 'Нет'}")
-                        for disipline in module.child_plan_strings.all():
-                            print(
-                                f"               └─ Дисциплина: {disipline.id} | {disipline.name} | Warnings: {disipline.warnings} | Description: {disipline.warning_description or 'Нет'}")
-                            clock_cells = disipline.clock_cells.all()
-                            if clock_cells:
-                                print("                   └─ Ячейки часов (привязанные к дисциплине):")
-                                for clock in clock_cells:
-                                    print(
-                                        f"                      ⏱ {clock.id} | Курс {clock.course}, Семестр {clock.semestr}, Часы: {clock.count_of_clocks}")
+        for sp in plans:
+            for line in self.report_tree(sp, 0, depth, warnings_only):
+                print(line)
+
+    def report_tree(self, obj, level, depth, warnings_only):
+        """
+        Строки отчета для объекта уровня level и его потомков до depth.
+        С warnings_only объект без предупреждений выводится, только если
+        предупреждения есть у потомков.
+        """
+        lines = []
+        if level + 1 < depth:
+            if REPORT_LEVELS[level] == 'discipline':
+                clock_cells = obj.clock_cells.all()
+                if clock_cells and (obj.warnings or not warnings_only):
+                    lines.append("                   └─ Ячейки часов (привязанные к дисциплине):")
+                    lines.extend(
+                        f"                      ⏱ {clock.id} | Курс {clock.course}, Семестр {clock.semestr}, Часы: {clock.count_of_clocks}"
+                        for clock in clock_cells
+                    )
+            else:
+                for child in getattr(obj, REPORT_CHILDREN[level]).all():
+                    lines.extend(self.report_tree(child, level + 1, depth, warnings_only))
+
+        if warnings_only and not obj.warnings and not lines:
+            return []
+        return [self.report_line(REPORT_LEVELS[level], obj)] + lines
+
+    def report_line(self, level, obj):
+        description = f"Warnings: {obj.warnings} | Description: {obj.warning_description or 'Нет'}"
+        if level == 'plan':
+            return f"{obj.id} | Квалификация: {obj.qualification}, Год начала: {obj.admission_year}, Дата: {obj.create_date} | {description}"
+        if level == 'category':
+            return f"   └─ Категория: {obj.id} | {obj.identificator}: {obj.cycles} | {description}"
+        if level == 'cycle':
+            return f"       └─ Учебный цикл: {obj.id} | {obj.identificator}: {obj.cycles} | {description}"
+        if level == 'module':
+            return f"           └─ Модуль: {obj.id} | Дисциплина: {obj.name} | {description}"
+        return f"               └─ Дисциплина: {obj.id} | {obj.name} | {description}"
+
+    def print_model_summary(self, plans):
+        """Выводит число объектов каждой модели в планах plans и сколько из них с предупреждениями."""
+        print("\n=== Сводка по моделям ===")
+        querysets = [
+            ("Учебные планы", plans),
+            ("Категории", Category.objects.filter(study_plan__in=plans)),
+            ("Учебные циклы", StudyCycle.objects.filter(category__study_plan__in=plans)),
+            ("Модули", Module.objects.filter(studey_cycle__category__study_plan__in=plans)),
+            ("Дисциплины", Disipline.objects.filter(module__studey_cycle__category__study_plan__in=plans)),
+        ]
+        for title, queryset in querysets:
+            counts = queryset.aggregate(total=Count('id'), warnings=Count('id', filter=Q(warnings=True)))
+            print(f"{title}: {counts['total']}, с предупреждениями: {counts['warnings']}")
+        clock_cells = ClockCell.objects.filter(
+            Q(plan_string__module__studey_cycle__category__study_plan__in=plans)
+            | Q(module_plan_string__studey_cycle__category__study_plan__in=plans)
+        )
+        print(f"Ячейки часов: {clock_cells.count()}")
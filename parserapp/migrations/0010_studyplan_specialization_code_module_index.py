@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:07
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parserapp', '0009_rename_gos_type_studyplan_admission_year_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='module',
+            name='index',
+            field=models.CharField(max_length=255, null=True),
+        ),
+        migrations.AddField(
+            model_name='studyplan',
+            name='specialization_code',
+            field=models.CharField(max_length=255, null=True),
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parserapp', '0010_studyplan_specialization_code_module_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studyplan',
+            name='importer_version',
+            field=models.CharField(max_length=32, null=True),
+        ),
+        migrations.AddField(
+            model_name='studyplan',
+            name='source_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+    ]
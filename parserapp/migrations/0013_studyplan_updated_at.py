@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 10:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parserapp', '0012_spellcheckresult'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studyplan',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parserapp', '0013_studyplan_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studyplan',
+            name='plan_identity',
+            field=models.CharField(max_length=1024, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 11:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parserapp', '0014_studyplan_plan_identity'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studyplan',
+            name='validation_hash',
+            field=models.CharField(max_length=64, null=True),
+        ),
+    ]
@@ -2,11 +2,18 @@ from django.db import models
 
 class StudyPlan(models.Model):
     id = models.CharField(primary_key=True, max_length=255)
+    specialization_code = models.CharField(max_length=255, null=True)
     qualification = models.CharField(max_length=255, null=True)
     admission_year = models.CharField(max_length=255, null=True)
+    # Квалификация и коды заголовка Планы: различает планы одной специальности и года набора
+    plan_identity = models.CharField(max_length=1024, null=True)
     create_date = models.DateField(null=True)
     warnings = models.BooleanField(default=False)
     warning_description = models.JSONField(null=True, blank=True)
+    source_hash = models.CharField(max_length=64, null=True)  # sha256 исходного файла .plx
+    importer_version = models.CharField(max_length=32, null=True)
+    validation_hash = models.CharField(max_length=64, null=True)  # бэкенд орфографии и вайтлист при проверке
+    updated_at = models.DateTimeField(auto_now=True, null=True, db_index=True)  # последняя запись плана в БД
 
     def __str__(self):
         return f"{self.qualification} ({self.admission_year})"
@@ -36,6 +43,7 @@ class StudyCycle(models.Model):
 class Module(models.Model):
     id = models.CharField(primary_key=True, max_length=255)
     name = models.CharField(max_length=255, null=True)
+    index = models.CharField(max_length=255, null=True)
     studey_cycle = models.ForeignKey(StudyCycle, related_name='plan_strings', on_delete=models.CASCADE)
     warnings = models.BooleanField(default=False)
     warning_description = models.JSONField(null=True, blank=True)
@@ -72,3 +80,14 @@ class WhitelistWord(models.Model):
 
     def __str__(self):
         return self.word
+
+class SpellCheckResult(models.Model):
+    """Сохраненный ответ бэкенда проверки орфографии для нормализованного текста."""
+    key = models.CharField(max_length=64, unique=True)  # sha256 от версии бэкенда и текста
+    backend_version = models.CharField(max_length=64)
+    text = models.TextField()
+    changes = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.backend_version}: {self.text}"
@@ -1,13 +1,32 @@
 from datetime import datetime
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
 from parserapp.models import StudyPlan, Category, StudyCycle, Module, Disipline, ClockCell
-from parserapp.validators import validate_text, validate_discipline_index, validate_discipline_hours
+from parserapp.hours import plan_to_json
+from parserapp.parser import PARSER_VERSION
+from parserapp.validators import (
+    validate_text, validate_texts, validate_discipline_index, validate_plan_indices, validate_discipline_hours,
+    validate_plan_hours, VALIDATORS_VERSION
+)
 
-def load_json_to_models(rup_data):
-    """
-    Загружает данные из JSON-структуры, сформированной get_plan_rup(),
-    в модели Django. Осуществляет предварительное преобразование даты.
-    """
-    # Очистка базы данных перед загрузкой новых данных
+# Версия импорта, сохраняется в StudyPlan вместе с хешем исходного файла
+IMPORTER_VERSION = f"{PARSER_VERSION}.{VALIDATORS_VERSION}"
+
+# Размер пачки INSERT для bulk_create по умолчанию
+DEFAULT_BATCH_SIZE = 500
+
+# Отправляется после фиксации записи планов в БД: plan_ids - id записанных
+# планов, None - все планы (очистка). Получатель сбрасывает кеш планов.
+plans_written = Signal()
+
+def notify_plans_written(plan_ids):
+    """Отправляет plans_written после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: plans_written.send(sender=StudyPlan, plan_ids=plan_ids))
+
+def clear_models():
+    """Удаляет все загруженные планы и связанные с ними объекты."""
+    notify_plans_written(None)
     StudyPlan.objects.all().delete()
     Category.objects.all().delete()
     StudyCycle.objects.all().delete()
@@ -15,6 +34,20 @@ def load_json_to_models(rup_data):
     Disipline.objects.all().delete()
     ClockCell.objects.all().delete()
 
+def load_json_to_models(rup_data, clear=True):
+    """
+    Загружает данные из JSON-структуры, сформированной get_plan_rup(),
+    в модели Django. Осуществляет предварительное преобразование даты.
+    clear=False сохраняет уже загруженные планы (пакетная загрузка).
+    План с матрицей часов (rup['hours']) разворачивается в прежний JSON-вид.
+    """
+    if "hours" in rup_data:
+        rup_data = plan_to_json(rup_data)
+
+    # Очистка базы данных перед загрузкой новых данных
+    if clear:
+        clear_models()
+
     create_date_str = rup_data.get("create_date")
     if create_date_str:
         try:
@@ -27,8 +60,10 @@ def load_json_to_models(rup_data):
 
     study_plan_obj = StudyPlan.objects.create(
         id=rup_data["id"],
+        specialization_code=rup_data.get("specialization_code"),
         qualification=rup_data.get("qualification"),
         admission_year=rup_data.get("admission_year"),
+        plan_identity=rup_data.get("plan_identity"),
         create_date=create_date
     )
 
@@ -78,6 +113,7 @@ def load_json_to_models(rup_data):
                 module_obj = Module.objects.create(
                     id=plan["id"],
                     name=module_name,
+                    index=plan.get("code_of_discipline"),
                     studey_cycle=study_cycle_obj,
                     warnings=bool(module_warnings),
                     warning_description=module_warnings
@@ -167,4 +203,389 @@ def load_json_to_models(rup_data):
 
         print("=== Найденные опечатки ===")
         for warning in all_warnings:
-            print(warning)
\ No newline at end of file
+            print(warning)
+
+    notify_plans_written([study_plan_obj.id])
+
+def parse_create_date(rup_data):
+    """Преобразует create_date из JSON плана в date или None."""
+    create_date_str = rup_data.get("create_date")
+    if not create_date_str:
+        return None
+    try:
+        return datetime.strptime(create_date_str, "%Y-%m-%dT%H:%M:%S").date()
+    except Exception as e:
+        print(f"Ошибка преобразования даты: {e}")
+        return None
+
+def collect_texts(rup_data):
+    """Возвращает все названия плана, которые проходят проверку орфографии, в порядке обхода."""
+    texts = []
+    for cycle in rup_data.get("stady_plan", []):
+        texts.append(cycle.get("cycles"))
+        for child in cycle.get("children", []):
+            texts.append(child.get("cycles"))
+            for plan in child.get("plans_of_string", []):
+                texts.append(plan.get("discipline"))
+                texts.extend(child_plan.get("discipline") for child_plan in plan.get("children_strings", []))
+    return [text for text in texts if text is not None]
+
+def collect_indices(rup_data):
+    """Возвращает индексы дисциплин плана, сгруппированные по модулям: {id модуля: [индексы]}."""
+    return {
+        plan["id"]: [child_plan.get("code_of_discipline") for child_plan in plan.get("children_strings", [])]
+        for cycle in rup_data.get("stady_plan", [])
+        for child in cycle.get("children", [])
+        for plan in child.get("plans_of_string", [])
+    }
+
+def collect_plan_strings(rup_data):
+    """Возвращает строки плана с часами в порядке обхода: [('module' | 'discipline', строка)]."""
+    plan_strings = []
+    for cycle in rup_data.get("stady_plan", []):
+        for child in cycle.get("children", []):
+            for plan in child.get("plans_of_string", []):
+                plan_strings.append(('module', plan))
+                plan_strings.extend(('discipline', child_plan) for child_plan in plan.get("children_strings", []))
+    return plan_strings
+
+def merge_warnings(*groups):
+    """Объединяет списки предупреждений, пропуская пустые. Возвращает None, если их нет."""
+    merged = [warning for group in groups if group for warning in group]
+    return merged or None
+
+def build_clock_cell(clock, **parent):
+    return ClockCell(
+        id=clock["id"],
+        code_of_type_work=clock.get("code_of_type_work"),
+        code_of_type_hours=clock.get("code_of_type_hours"),
+        course=int(clock["course"]),
+        semestr=int(clock["term"]),
+        count_of_clocks=int(clock.get("count_of_clocks") or 0),
+        **parent
+    )
+
+def build_model_objects(rup_data, text_warnings=None):
+    """
+    Строит несохраненные объекты моделей для всего плана. Все проверки
+    (орфография, индексы, часы) выполняются до создания объекта, поэтому
+    поля warnings/warning_description заполняются сразу.
+    text_warnings - готовый результат validate_texts для названий плана;
+    без него орфография проверяется отдельным этапом перед построением.
+    Возвращает словарь {модель: [объекты]} и список всех опечаток.
+    """
+    objects = {model: [] for model in (StudyPlan, Category, StudyCycle, Module, Disipline, ClockCell)}
+    all_warnings = []
+    if text_warnings is None:
+        text_warnings = validate_texts(collect_texts(rup_data))
+    index_warnings_by_module = validate_plan_indices(
+        collect_indices(rup_data), rup_data.get("qualification")
+    )
+    hours = rup_data["hours"]
+    hour_warnings_by_string = validate_plan_hours(hours, collect_plan_strings(rup_data))
+
+    def check_text(text):
+        warnings = text_warnings.get(text) if text is not None else None
+        if warnings:
+            all_warnings.extend(warnings)
+        return warnings
+
+    study_plan_obj = StudyPlan(
+        id=rup_data["id"],
+        specialization_code=rup_data.get("specialization_code"),
+        qualification=rup_data.get("qualification"),
+        admission_year=rup_data.get("admission_year"),
+        plan_identity=rup_data.get("plan_identity"),
+        create_date=parse_create_date(rup_data),
+        source_hash=rup_data.get("source_hash"),
+        importer_version=IMPORTER_VERSION if rup_data.get("source_hash") else None,
+        validation_hash=rup_data.get("validation_hash")
+    )
+    objects[StudyPlan].append(study_plan_obj)
+
+    for cycle in rup_data.get("stady_plan", []):
+        category_warnings = check_text(cycle.get("cycles"))
+        category_obj = Category(
+            id=cycle["id"],
+            identificator=cycle.get("identificator"),
+            cycles=cycle.get("cycles"),
+            study_plan=study_plan_obj,
+            warnings=bool(category_warnings),
+            warning_description=category_warnings
+        )
+        objects[Category].append(category_obj)
+
+        for child in cycle.get("children", []):
+            study_cycle_warnings = check_text(child.get("cycles"))
+            study_cycle_obj = StudyCycle(
+                id=child["id"],
+                identificator=child.get("identificator"),
+                cycles=child.get("cycles"),
+                category=category_obj,
+                warnings=bool(study_cycle_warnings),
+                warning_description=study_cycle_warnings
+            )
+            objects[StudyCycle].append(study_cycle_obj)
+
+            for plan in child.get("plans_of_string", []):
+                module_hour_warnings = hour_warnings_by_string.get(plan["id"])
+                if module_hour_warnings:
+                    all_warnings.extend(module_hour_warnings)
+                module_warnings = merge_warnings(check_text(plan.get("discipline")), module_hour_warnings)
+                module_obj = Module(
+                    id=plan["id"],
+                    name=plan.get("discipline"),
+                    index=plan.get("code_of_discipline"),
+                    studey_cycle=study_cycle_obj,
+                    warnings=bool(module_warnings),
+                    warning_description=module_warnings
+                )
+                objects[Module].append(module_obj)
+                objects[ClockCell].extend(
+                    build_clock_cell(clock, module_plan_string=module_obj)
+                    for clock in hours.cells(plan["id"])
+                )
+
+                module_index_warnings = index_warnings_by_module[plan["id"]]
+                for child_plan, index_warnings in zip(plan.get("children_strings", []), module_index_warnings):
+                    discipline_index = child_plan.get("code_of_discipline")
+                    discipline_warnings = check_text(child_plan.get("discipline"))
+
+                    if index_warnings:
+                        print("=== Ошибки валидации индекса ===")
+                        for warning in index_warnings:
+                            print(warning)
+
+                    hour_warnings = hour_warnings_by_string.get(child_plan["id"])
+                    if hour_warnings:
+                        all_warnings.extend(hour_warnings)
+
+                    description = merge_warnings(discipline_warnings, index_warnings, hour_warnings)
+                    disipline_obj = Disipline(
+                        id=child_plan["id"],
+                        name=child_plan.get("discipline"),
+                        index=discipline_index,
+                        module=module_obj,
+                        warnings=bool(description),
+                        warning_description=description
+                    )
+                    objects[Disipline].append(disipline_obj)
+                    objects[ClockCell].extend(
+                        build_clock_cell(clock, plan_string=disipline_obj)
+                        for clock in hours.cells(child_plan["id"])
+                    )
+
+    return objects, all_warnings
+
+def load_json_to_models_bulk(rup_data, clear=True, batch_size=DEFAULT_BATCH_SIZE, text_warnings=None):
+    """
+    Пакетный вариант load_json_to_models: сначала строит и проверяет все
+    объекты плана в памяти, затем записывает их через bulk_create пачками
+    по batch_size в одной транзакции (несколько INSERT на таблицу).
+    """
+    objects, all_warnings = build_model_objects(rup_data, text_warnings)
+
+    with transaction.atomic():
+        if clear:
+            clear_models()
+        for model, model_objects in objects.items():
+            model.objects.bulk_create(model_objects, batch_size=batch_size)
+        notify_plans_written([study_plan.id for study_plan in objects[StudyPlan]])
+
+    print("=== Найденные опечатки ===")
+    for warning in all_warnings:
+        print(warning)
+    return objects
+
+# Порядок моделей плана сверху вниз по дереву
+PLAN_MODELS = (StudyPlan, Category, StudyCycle, Module, Disipline, ClockCell)
+
+def natural_key(obj, parent_key):
+    """
+    Естественный ключ объекта плана внутри родителя: шифр, год набора и
+    plan_identity плана, идентификатор цикла, индекс (или название) строки
+    плана, курс/семестр/вид работы ячейки.
+    """
+    if isinstance(obj, StudyPlan):
+        return (obj.specialization_code, obj.admission_year, obj.plan_identity)
+    if isinstance(obj, (Category, StudyCycle)):
+        return (parent_key, obj.identificator)
+    if isinstance(obj, (Module, Disipline)):
+        return (parent_key, obj.index or obj.name)
+    return (parent_key, obj.course, obj.semestr, obj.code_of_type_work, obj.code_of_type_hours)
+
+def unique_keys(objects, parent_keys, get_parent_id):
+    """
+    Строит словарь {естественный ключ: объект}. Повторяющиеся ключи
+    (например, две строки без индекса с одним названием) различаются
+    порядковым номером вхождения.
+    """
+    keyed = {}
+    for obj in objects:
+        key = natural_key(obj, parent_keys.get(get_parent_id(obj)))
+        occurrence = 0
+        while (key, occurrence) in keyed:
+            occurrence += 1
+        keyed[(key, occurrence)] = obj
+    return keyed
+
+def clock_cell_parent_id(clock):
+    return ('disipline', clock.plan_string_id) if clock.plan_string_id else ('module', clock.module_plan_string_id)
+
+def existing_plan_objects(study_plan):
+    """Загружает сохраненное дерево плана плоскими запросами, по одному на таблицу."""
+    categories = list(Category.objects.filter(study_plan=study_plan))
+    study_cycles = list(StudyCycle.objects.filter(category__study_plan=study_plan))
+    modules = list(Module.objects.filter(studey_cycle__category__study_plan=study_plan))
+    disiplines = list(Disipline.objects.filter(module__studey_cycle__category__study_plan=study_plan))
+    clock_cells = list(
+        ClockCell.objects.filter(module_plan_string__studey_cycle__category__study_plan=study_plan)
+    ) + list(
+        ClockCell.objects.filter(plan_string__module__studey_cycle__category__study_plan=study_plan)
+    )
+    return {
+        StudyPlan: [study_plan],
+        Category: categories,
+        StudyCycle: study_cycles,
+        Module: modules,
+        Disipline: disiplines,
+        ClockCell: clock_cells,
+    }
+
+def key_plan_objects(objects):
+    """Раскладывает объекты плана по естественным ключам, сверху вниз по дереву."""
+    study_plans = unique_keys(objects[StudyPlan], {}, lambda obj: None)
+    plan_keys = {obj.pk: key for key, obj in study_plans.items()}
+    categories = unique_keys(objects[Category], plan_keys, lambda obj: obj.study_plan_id)
+    category_keys = {obj.pk: key for key, obj in categories.items()}
+    study_cycles = unique_keys(objects[StudyCycle], category_keys, lambda obj: obj.category_id)
+    study_cycle_keys = {obj.pk: key for key, obj in study_cycles.items()}
+    modules = unique_keys(objects[Module], study_cycle_keys, lambda obj: obj.studey_cycle_id)
+    module_keys = {obj.pk: key for key, obj in modules.items()}
+    disiplines = unique_keys(objects[Disipline], module_keys, lambda obj: obj.module_id)
+    disipline_keys = {obj.pk: key for key, obj in disiplines.items()}
+
+    string_keys = {('module', pk): key for pk, key in module_keys.items()}
+    string_keys.update({('disipline', pk): key for pk, key in disipline_keys.items()})
+    clock_cells = unique_keys(objects[ClockCell], string_keys, clock_cell_parent_id)
+
+    return {
+        StudyPlan: study_plans,
+        Category: categories,
+        StudyCycle: study_cycles,
+        Module: modules,
+        Disipline: disiplines,
+        ClockCell: clock_cells,
+    }
+
+def changed_fields(new_obj, old_obj):
+    # Метки времени (auto_now) выставляются при записи, а не сравниваются
+    return [
+        field.name for field in new_obj._meta.concrete_fields
+        if not field.primary_key and not getattr(field, 'auto_now', False)
+        and getattr(new_obj, field.attname) != getattr(old_obj, field.attname)
+    ]
+
+def find_stored_plan(new_plan):
+    """
+    Находит сохраненную версию плана по шифру, году набора и plan_identity.
+    План, загруженный до появления plan_identity (поле пустое), сопоставляется
+    по шифру и году и получает plan_identity нового. Если подходящих планов
+    несколько, бросает StudyPlan.MultipleObjectsReturned: какой из них
+    обновлять, неизвестно.
+    """
+    plans = StudyPlan.objects.filter(
+        specialization_code=new_plan.specialization_code,
+        admission_year=new_plan.admission_year,
+    )
+    for candidates in (plans.filter(plan_identity=new_plan.plan_identity), plans.filter(plan_identity__isnull=True)):
+        candidates = list(candidates[:2])
+        if len(candidates) > 1:
+            raise StudyPlan.MultipleObjectsReturned(
+                f"В БД несколько планов {new_plan.specialization_code} {new_plan.admission_year} "
+                f"с идентичностью '{candidates[0].plan_identity}': обновляемый план не определен"
+            )
+        if candidates:
+            old_plan = candidates[0]
+            if old_plan.plan_identity != new_plan.plan_identity:
+                StudyPlan.objects.filter(pk=old_plan.pk).update(plan_identity=new_plan.plan_identity)
+                old_plan.plan_identity = new_plan.plan_identity
+            return old_plan
+    return None
+
+def upsert_json_to_models(rup_data, batch_size=DEFAULT_BATCH_SIZE, text_warnings=None):
+    """
+    Инкрементальная загрузка плана: сопоставляет объекты с уже сохраненными
+    по естественным ключам (шифр специальности, год набора и plan_identity
+    плана, идентификатор цикла, индекс дисциплины) и вставляет, обновляет или
+    удаляет только отличающиеся строки. Остальные планы в БД не затрагиваются.
+    Сохраненные объекты сохраняют свои id. Если в дереве плана изменилась
+    хоть одна строка, у плана обновляется updated_at.
+    Возвращает {имя модели: {'inserted': n, 'updated': n, 'deleted': n}}.
+    """
+    objects, all_warnings = build_model_objects(rup_data, text_warnings)
+    new_plan = objects[StudyPlan][0]
+    stats = {model.__name__: {'inserted': 0, 'updated': 0, 'deleted': 0} for model in PLAN_MODELS}
+
+    with transaction.atomic():
+        old_plan = find_stored_plan(new_plan)
+        old_objects = existing_plan_objects(old_plan) if old_plan else {model: [] for model in PLAN_MODELS}
+        old_keyed = key_plan_objects(old_objects)
+        new_keyed = key_plan_objects(objects)
+
+        to_delete = {}
+        for model in PLAN_MODELS:
+            old_by_key = old_keyed[model]
+            new_by_key = new_keyed[model]
+
+            # Совпавшие объекты получают id сохраненных, а ссылки на родителей
+            # переставляются через закешированные родительские объекты
+            for key, obj in new_by_key.items():
+                for field in obj._meta.concrete_fields:
+                    if field.is_relation and field.is_cached(obj):
+                        parent = getattr(obj, field.name)
+                        setattr(obj, field.attname, parent.pk if parent else None)
+                if key in old_by_key:
+                    obj.pk = old_by_key[key].pk
+
+            to_insert = [obj for key, obj in new_by_key.items() if key not in old_by_key]
+            to_update = []
+            update_fields = set()
+            for key, obj in new_by_key.items():
+                fields = changed_fields(obj, old_by_key[key]) if key in old_by_key else None
+                if fields:
+                    to_update.append(obj)
+                    update_fields.update(fields)
+            to_delete[model] = [obj.pk for key, obj in old_by_key.items() if key not in new_by_key]
+
+            model.objects.bulk_create(to_insert, batch_size=batch_size)
+            if to_update:
+                model.objects.bulk_update(to_update, sorted(update_fields), batch_size=batch_size)
+            stats[model.__name__]['inserted'] = len(to_insert)
+            stats[model.__name__]['updated'] = len(to_update)
+
+        # Удаляем снизу вверх, чтобы каскад не задевал уже посчитанные строки
+        for model in reversed(PLAN_MODELS):
+            if to_delete[model]:
+                model.objects.filter(pk__in=to_delete[model]).delete()
+            stats[model.__name__]['deleted'] = len(to_delete[model])
+
+        if any(count for counts in stats.values() for count in counts.values()):
+            StudyPlan.objects.filter(pk=new_plan.pk).update(updated_at=timezone.now())
+            notify_plans_written([new_plan.pk])
+
+    print("=== Найденные опечатки ===")
+    for warning in all_warnings:
+        print(warning)
+    return stats
+
+def imported_fingerprints(source_hashes, validation_hash=None):
+    """
+    Возвращает хеши файлов, которые уже загружены текущей версией импорта
+    и проверены с теми же настройками проверки (validation_fingerprint).
+    """
+    return set(
+        StudyPlan.objects.filter(
+            source_hash__in=source_hashes, importer_version=IMPORTER_VERSION, validation_hash=validation_hash
+        ).values_list('source_hash', flat=True)
+    )
@@ -1,15 +1,78 @@
 import xml.etree.ElementTree as et
 from xml.etree.ElementTree import Element
 from typing import List
+import hashlib
 import json
 import uuid
-from parserapp.validators import validate_discipline_index
+
+from parserapp.hours import HourMatrix, plan_to_json
+
+# Версия разбора: увеличивается при изменениях, влияющих на результат
+PARSER_VERSION = "3"
+
+XML_NAMESPACE = "{http://tempuri.org/dsMMISDB.xsd}"
+
+# Таблицы dsMMISDB, которые нужны для построения плана. Остальные
+# (компетенции, кафедры, должностные лица и т.д.) в потоковом режиме
+# отбрасываются сразу после чтения.
+USED_TAGS = {
+    "Планы",
+    "ООП",
+    "ПланыЦиклы",
+    "ПланыСтроки",
+    "ПланыНовыеЧасы",
+    "СправочникВидыРабот",
+    "СправочникТипаЧасов",
+}
+
+# Виды работ и тип часов, которые попадают в ячейки часов плана
+TRUE_TYPE_OF_WORKS = {
+    'Итого часов',
+    'Лекционные занятия',
+    'Практические занятия',
+    'Самостоятельная работа',
+    'Часы на контроль',
+    'Курсовое проектирование',
+}
+HOURS_TYPE = 'Часы в объемных показателях'
+
+# Сетка часов по умолчанию (курсы и семестры курса), если в заголовке плана нет срока обучения
+DEFAULT_COURSES = 4
+DEFAULT_TERMS = 2
+
+# Пространство имен для детерминированных id (uuid5) в режиме stable_ids
+ID_NAMESPACE = uuid.uuid5(uuid.NAMESPACE_URL, "http://tempuri.org/dsMMISDB.xsd")
+
+# Атрибуты заголовка Планы, которые вместе с шифром, годом набора и
+# квалификацией различают планы одной специальности (форма обучения, база,
+# код ООП, имя файла плана)
+PLAN_IDENTITY_KEYS = ('Код', 'КодООП', 'КодФормыОбучения', 'КодБазы', 'ИмяФайла')
+
+# Глубина таблиц dsMMISDB: Документ -> diffgr:diffgram -> dsMMISDB -> таблица
+TABLE_DEPTH = 4
+
 
 class RUP_parser:
-    def __init__(self, filename: str = "gg.plx"):
-        self.tree = et.parse(filename)
-        self.root = self.tree.getroot()
-        self.root_child = self.root[0][0]
+    def __init__(self, filename: str = "gg.plx", streaming: bool = False, stable_ids: bool = False):
+        """
+        streaming=True включает потоковый режим: файл читается через iterparse,
+        полное дерево документа не строится, а в памяти остаются только
+        элементы из USED_TAGS.
+        stable_ids=True выдает детерминированные id (uuid5) вместо uuid4:
+        повторный разбор того же плана дает тот же JSON.
+        """
+        self.filename = filename
+        self.streaming = streaming
+        self.stable_ids = stable_ids
+
+        if streaming:
+            self.tree = None
+            self.root = None
+            self.root_child = None
+        else:
+            self.tree = et.parse(filename)
+            self.root = self.tree.getroot()
+            self.root_child = self.root[0][0]
 
         self.plan_dict = []
         self.rup = {}
@@ -21,30 +84,79 @@ class RUP_parser:
         self.plany_stroky_childs: List[Element] = []
         self.spravochnik_vidy_rabot: dict = {}
         self.spravochnik_tipa_chasov: dict = {}
-    
-    def get_elements_from_file(self):
-        for child in self.root_child:
-            tag_name = child.tag.replace("{http://tempuri.org/dsMMISDB.xsd}", '')
+        self.hours_by_object: dict = {}
+        self.hours = None
+        self.courses = DEFAULT_COURSES
+        self.terms = DEFAULT_TERMS
+
+        # Индексы смежности, заполняются в get_elements_from_file
+        self.cycles_by_parent: dict = {}
+        self.strings_by_block: dict = {}
+        self.strings_by_parent: dict = {}
+
+    def iter_elements_streaming(self):
+        """
+        Потоково читает таблицы dsMMISDB и отдает только элементы из USED_TAGS.
+        Каждый прочитанный элемент сразу отцепляется от родителя, поэтому
+        пиковая память не зависит от размера ненужных таблиц.
+        """
+        depth = 0
+        parents = []
+        for event, elem in et.iterparse(self.filename, events=("start", "end")):
+            if event == "start":
+                depth += 1
+                parents.append(elem)
+                continue
+
+            parents.pop()
+            depth -= 1
+            if depth != TABLE_DEPTH - 1:
+                continue
+
+            if elem.tag.replace(XML_NAMESPACE, '') in USED_TAGS:
+                yield elem
+            else:
+                elem.clear()
+            parents[-1].remove(elem)
+
+    def get_elements_from_file(self, elements=None):
+        """
+        Раскладывает таблицы плана по спискам и индексам смежности.
+        elements позволяет передать готовую последовательность элементов
+        вместо чтения self.filename (используется в бенчмарках).
+        """
+        if elements is None:
+            elements = self.iter_elements_streaming() if self.streaming else self.root_child
+        for child in elements:
+            tag_name = child.tag.replace(XML_NAMESPACE, '')
             match tag_name:
                 case "ПланыЦиклы":
-                    if child.attrib.get('КодРодителя'):
+                    parent_code = child.attrib.get('КодРодителя')
+                    if parent_code:
                         self.plany_ciclov_childs.append(child)
+                        self.cycles_by_parent.setdefault(parent_code, []).append(child)
                     else:
                         self.plany_ciclov.append(child)
                 case "ПланыСтроки":
-                    if child.attrib.get('КодРодителя'):
+                    parent_code = child.attrib.get('КодРодителя')
+                    if parent_code:
                         self.plany_stroky_childs.append(child)
+                        self.strings_by_parent.setdefault(parent_code, []).append(child)
                     else:
                         self.plany_stroky.append(child)
+                        self.strings_by_block.setdefault(child.get('КодБлока'), []).append(child)
                 case "ПланыНовыеЧасы":
                     self.plany_novie_chasy.append(child)
                 case "Планы":
-                    self.rup = {
+                    # ООП может идти в файле раньше Планы, поэтому дополняем rup, а не заменяем
+                    self.rup.update({
                         'id': str(uuid.uuid4()),
                         'qualification': child.get('Квалификация'),
                         'admission_year': child.get('ГодНачалаПодготовки'),
+                        'plan_identity': plan_identity(child),
                         'stady_plan': []
-                    }
+                    })
+                    self.courses, self.terms = plan_grid(child)
                 case "ООП":
                     self.rup['specialization_code'] = child.get('Шифр')
                     self.rup['name'] = child.get('Название')
@@ -64,151 +176,171 @@ class RUP_parser:
             })
 
     def make_children_cycles(self):
-        for child in self.plany_ciclov_childs:
-            parent_code = child.get("КодРодителя")
-            for parent in self.plan_dict:
-                if parent_code == parent['id']:
-                    parent['children'].append({
-                        "id": child.get('Код'),
-                        "identificator": child.get('Идентификатор'),
-                        "cycles": child.get('Цикл'),
-                        "parent_id": child.get('КодРодителя'),
-                        "plans_of_string": []
-                    })
+        for parent in self.plan_dict:
+            for child in self.cycles_by_parent.get(parent['id'], []):
+                parent['children'].append({
+                    "id": child.get('Код'),
+                    "identificator": child.get('Идентификатор'),
+                    "cycles": child.get('Цикл'),
+                    "parent_id": child.get('КодРодителя'),
+                    "plans_of_string": []
+                })
 
-    def get_clock_cells(self, child_object, child_code_xml):
+    def make_id(self, *parts):
+        """
+        Возвращает id узла плана. В режиме stable_ids id выводится из
+        идентичности плана (шифр, год набора и plan_identity - квалификация
+        и атрибуты PLAN_IDENTITY_KEYS заголовка Планы) и кода узла в исходном XML,
+        иначе это случайный uuid4.
+        """
+        if not self.stable_ids:
+            return str(uuid.uuid4())
 
-        true_type_of_works = ['Итого часов', 'Лекционные занятия', 'Практические занятия', 'Самостоятельная работа', 'Часы на контроль', 'Курсовое проектирование']
-        for hour in self.plany_novie_chasy:
-            new_hour_parent_id = hour.get("КодОбъекта")
+        name = "|".join(
+            str(value) for value in (
+                self.rup.get('specialization_code'), self.rup.get('admission_year'), self.rup.get('plan_identity'),
+                *parts,
+            )
+        )
+        return str(uuid.uuid5(ID_NAMESPACE, name))
 
+    def index_hours(self):
+        """
+        Строит индекс КодОбъекта -> список часов за один проход по ПланыНовыеЧасы.
+        Коды видов работ и типов часов разрешаются через справочники один раз,
+        неподходящие записи отбрасываются сразу.
+        """
+        self.hours_by_object = {}
+        for hour in self.plany_novie_chasy:
             code_of_type_work = self.spravochnik_vidy_rabot.get(hour.get("КодВидаРаботы"))
-            code_of_type_hourse = self.spravochnik_tipa_chasov.get((hour.get("КодТипаЧасов")))
-
-            if new_hour_parent_id == child_code_xml and int(hour.get("Количество")) > 1:
-                if code_of_type_hourse == 'Часы в объемных показателях' and code_of_type_work in true_type_of_works:
-                    course = int(hour.get("Курс"))
-                    term = int(hour.get("Семестр"))
-                    child_object['clock_cells'][course - 1]['terms'][term - 1]['clock_cells'].append({
-                        'id': str(uuid.uuid4()),
-                        'code_of_type_work': code_of_type_work,
-                        'code_of_type_hours': code_of_type_hourse,
-                        'course': int(course),
-                        'term': int(term),
-                        'count_of_clocks': int(hour.get("Количество")),
-                        'parent_string_id': child_object['id']
-                    })
+            code_of_type_hourse = self.spravochnik_tipa_chasov.get(hour.get("КодТипаЧасов"))
+            if code_of_type_hourse != HOURS_TYPE or code_of_type_work not in TRUE_TYPE_OF_WORKS:
+                continue
 
+            count_of_clocks = int(hour.get("Количество"))
+            if count_of_clocks <= 1:
+                continue
 
-    def generate_courses_array(self):
-        courses = []
+            self.hours_by_object.setdefault(hour.get("КодОбъекта"), []).append((
+                hour.get("Код"), code_of_type_work, int(hour.get("Курс")), int(hour.get("Семестр")), count_of_clocks
+            ))
 
-        for i in range(1, 5):
-            course_object = {
-                'id': str(uuid.uuid4()),
-                'course_number': i,
-                'terms': []
-            }
-
-            for j in range(1, 3):
-                term_object = {
-                    'id': str(uuid.uuid4()),
-                    'term_number': j,
-                    'clock_cells': []
-                }
-
-                course_object['terms'].append(term_object)
-
-            courses.append(course_object)
-        
-        print(courses)
-        return courses
-            
+    def get_clock_cells(self, string_id, string_code):
+        """Добавляет строку плана в матрицу часов вместе с ее ячейками."""
+        row = self.hours.add_string(string_id, string_code)
+        for code, code_of_type_work, course, term, count_of_clocks in self.hours_by_object.get(string_code, []):
+            self.hours.add_cell(row, course, term, code_of_type_work, count_of_clocks, self.make_id('hour', code))
 
     def get_parent_strings_with_hours(self):
         for cycl in self.plan_dict:
-            cycl['id'] = str(uuid.uuid4())
+            cycl['id'] = self.make_id('cycle', cycl['id'])
 
             for child in cycl['children']:
                 child_id_local = child['id']
-                child['id'] = str(uuid.uuid4())
+                child['id'] = self.make_id('cycle', child_id_local)
                 child['parent_id'] = cycl['id']
 
-                for string in self.plany_stroky:
-                    string_block_id = string.get("КодБлока")
-                    if child_id_local == string_block_id:
-                        parent_string_id_local = string.get('Код')
-                        parent_string_object = {
-                            'id': str(uuid.uuid4()),
-                            'discipline': string.get('Дисциплина'),
-                            'code_of_discipline': string.get('ДисциплинаКод'),
+                for string in self.strings_by_block.get(child_id_local, []):
+                    parent_string_id_local = string.get('Код')
+                    parent_string_object = {
+                        'id': self.make_id('string', parent_string_id_local),
+                        'discipline': string.get('Дисциплина'),
+                        'code_of_discipline': string.get('ДисциплинаКод'),
+                        'code_of_cycle_block': child['id'],
+                        'children_strings': []
+                    }
+
+                    for child_string in self.strings_by_parent.get(parent_string_id_local, []):
+                        child_string_id_local = child_string.get('Код')
+                        child_string_object = {
+                            'id': self.make_id('string', child_string_id_local),
+                            'discipline': child_string.get('Дисциплина'),
+                            'code_of_discipline': child_string.get('ДисциплинаКод'),
                             'code_of_cycle_block': child['id'],
-                            'clock_cells': self.generate_courses_array(),
-                            'children_strings': []
+                            'parent_string_id': parent_string_object['id'],
                         }
 
-                        for child_string in self.plany_stroky_childs:
-                            code_of_parent = child_string.get('КодРодителя')
-                            if parent_string_id_local == code_of_parent:
-                                child_string_id_local = child_string.get('Код')
-                                child_string_object = {
-                                    'id': str(uuid.uuid4()),
-                                    'discipline': child_string.get('Дисциплина'),
-                                    'code_of_discipline': child_string.get('ДисциплинаКод'),
-                                    'code_of_cycle_block': child['id'],
-                                    'parent_string_id': parent_string_object['id'],
-                                    'clock_cells': self.generate_courses_array(),
-                                }
-                                
-                                self.get_clock_cells(child_string_object, child_string_id_local)
-
-                                parent_string_object['children_strings'].append(child_string_object)
+                        self.get_clock_cells(child_string_object['id'], child_string_id_local)
 
+                        parent_string_object['children_strings'].append(child_string_object)
 
-                        self.get_clock_cells(parent_string_object, parent_string_id_local)
+                    self.get_clock_cells(parent_string_object['id'], parent_string_id_local)
 
-                        child['plans_of_string'].append(parent_string_object)
+                    child['plans_of_string'].append(parent_string_object)
 
-
-    def get_plan(self):
-        self.get_elements_from_file()
+    def build_tree(self):
+        """Собирает дерево плана из прочитанных элементов за один проход по индексам."""
+        if self.stable_ids:
+            self.rup['id'] = self.make_id('plan')
+        self.index_hours()
+        self.hours = HourMatrix(TRUE_TYPE_OF_WORKS, self.courses, self.terms, HOURS_TYPE)
         self.make_cycles()
         self.make_children_cycles()
         self.get_parent_strings_with_hours()
-
         self.rup['stady_plan'] = self.plan_dict
+        self.rup['hours'] = self.hours.freeze()
+        return self.plan_dict
 
-        with open("plan.json", "w", encoding="utf-8") as file:
-            json.dump(self.rup, file, ensure_ascii=False, indent=4)
+    def save_plan(self, path: str = "plan.json"):
+        """Сохраняет собранный план в JSON-виде (с clock_cells у строк)."""
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(plan_to_json(self.rup, self.make_id), file, ensure_ascii=False, indent=4)
         print("=== JSON data (from XML) ===")
 
-        # Test cases for index validation
-        previous_indices = {}
-        test_indices = [
-            ("УП.1", None),
-            ("УП.2", None),
-            ("УП.4", ["Неверная последовательность индекса 'УП.4'. Ожидается 'УП.3'."]),
-            ("УП.01", None),
-            ("УП.02", None),
-            ("УП.04", ["Неверная последовательность индекса 'УП.04'. Ожидается 'УП.03'."]),
-            ("УП.1.1", None),
-            ("УП.1.2", None),
-            ("УП.1.4", ["Неверная последовательность индекса 'УП.1.4'. Ожидается 'УП.1.3'."]),
-            ("УП.01.01", None),
-            ("УП.01.02", None),
-            ("УП.01.04", ["Неверная последовательность индекса 'УП.01.04'. Ожидается 'УП.01.03'."]),
-            ("УП.3", None), # Should work after two-part indices in single-digit format
-            ("УП.03", None),  # Should work after two-part indices in double-digit format
-            ("ОП.1", None),
-            ("ОП.01", None)
-        ]
-        for index, expected_error in test_indices:
-            errors = validate_discipline_index(index, previous_indices)
-            if errors == expected_error:
-                print(f"Test for '{index}': PASSED")
-            else:
-                print(f"Test for '{index}': FAILED")
-                print(f"  Expected: {expected_error}")
-                print(f"  Actual:   {errors}")
+    def get_plan(self):
+        self.get_elements_from_file()
+        self.build_tree()
+        self.save_plan()
 
         return self.plan_dict
+
+
+def plan_grid(plan_element):
+    """
+    Возвращает число курсов и семестров на курсе из заголовка плана (Планы).
+    Курсы считаются от первого (с учетом КурсНачалаОбуч), неполный год
+    срока обучения дает отдельный курс.
+    """
+    years = int(plan_element.get('СрокОбучения') or 0)
+    months = int(plan_element.get('СрокОбученияМесяцев') or 0)
+    first_course = int(plan_element.get('КурсНачалаОбуч') or 1)
+    courses = years + (1 if months else 0)
+    terms = int(plan_element.get('СеместровНаКурсе') or 0)
+
+    return (
+        first_course - 1 + courses if courses else DEFAULT_COURSES,
+        terms or DEFAULT_TERMS,
+    )
+
+
+def plan_identity(plan_element):
+    """
+    Возвращает строку, которая вместе с шифром и годом набора различает
+    планы одной специальности: квалификация и атрибуты PLAN_IDENTITY_KEYS
+    заголовка плана (Планы).
+    """
+    return "|".join(
+        str(value) for value in (plan_element.get('Квалификация'), *map(plan_element.get, PLAN_IDENTITY_KEYS))
+    )
+
+
+def parse_plan(filename: str, streaming: bool = False, stable_ids: bool = False):
+    """
+    Читает файл плана и собирает дерево без записи plan.json.
+    Вызывается в процессах пула при пакетной загрузке, поэтому
+    возвращает только словарь rup (часы - в rup['hours'], HourMatrix).
+    """
+    parser = RUP_parser(filename, streaming=streaming, stable_ids=stable_ids)
+    parser.get_elements_from_file()
+    parser.build_tree()
+    return parser.rup
+
+
+def file_fingerprint(filename: str) -> str:
+    """Возвращает sha256 содержимого файла плана."""
+    digest = hashlib.sha256()
+    with open(filename, "rb") as file:
+        for chunk in iter(lambda: file.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
@@ -0,0 +1,95 @@
+from itertools import islice
+
+from django.core.cache import caches
+
+from parserapp.models import StudyPlan
+from parserapp.models_loader import IMPORTER_VERSION
+from parserapp.serialization import plan_queryset, plan_to_dict
+
+# Псевдоним кеша сериализованных планов в settings.CACHES
+PLAN_CACHE_ALIAS = 'plans'
+
+# Планов в одной пачке прогрева и выгрузки
+PLAN_CACHE_CHUNK_SIZE = 100
+
+
+def plan_cache():
+    return caches[PLAN_CACHE_ALIAS]
+
+
+def plan_cache_key(plan_id):
+    """Ключ дерева плана: id плана и версия импорта, которой он загружен."""
+    return f"plan:{IMPORTER_VERSION}:{plan_id}"
+
+
+def plan_versions(plan_ids=None):
+    """Планы только с полями версии (id, updated_at) - по ним сверяется кеш."""
+    plans = StudyPlan.objects.only('id', 'updated_at')
+    if plan_ids is not None:
+        plans = plans.filter(id__in=plan_ids)
+    return plans
+
+
+def plan_chunks(plans, chunk_size=PLAN_CACHE_CHUNK_SIZE):
+    """Разбивает queryset планов на списки по chunk_size, не загружая его целиком."""
+    iterator = plans.iterator(chunk_size=chunk_size)
+    while chunk := list(islice(iterator, chunk_size)):
+        yield chunk
+
+
+def cached_plan_dicts(plans):
+    """
+    Деревья планов plans (объекты StudyPlan с id и updated_at) в виде
+    plan_to_dict: {id: дерево}. Берутся из кеша, если запись сделана для
+    того же updated_at; остальные сериализуются одной предзагрузкой и
+    кладутся в кеш. Сверка с updated_at защищает от устаревших записей,
+    которые не удалось сбросить (например, в кеше другого процесса).
+    """
+    cache = plan_cache()
+    keys = {plan_cache_key(plan.id): plan for plan in plans}
+    cached = cache.get_many(keys)
+
+    plan_dicts = {}
+    for key, plan in keys.items():
+        entry = cached.get(key)
+        if entry and entry['updated_at'] == plan.updated_at:
+            plan_dicts[plan.id] = entry['plan']
+
+    missing = [plan.id for plan in plans if plan.id not in plan_dicts]
+    if missing:
+        fresh = {}
+        for study_plan in plan_queryset().filter(id__in=missing):
+            plan_dicts[study_plan.id] = plan_to_dict(study_plan)
+            fresh[plan_cache_key(study_plan.id)] = {
+                'updated_at': study_plan.updated_at,
+                'plan': plan_dicts[study_plan.id],
+            }
+        cache.set_many(fresh)
+    return plan_dicts
+
+
+def get_plan_dict(plan_id):
+    """Дерево одного плана из кеша или БД; None, если плана нет."""
+    plan = plan_versions([plan_id]).first()
+    if plan is None:
+        return None
+    return cached_plan_dicts([plan])[plan.id]
+
+
+def warm_plan_cache(plan_ids=None, chunk_size=PLAN_CACHE_CHUNK_SIZE):
+    """
+    Заполняет кеш деревьями планов (всех или plan_ids) пачками по
+    chunk_size после пакетного импорта. Возвращает число планов.
+    """
+    warmed = 0
+    for chunk in plan_chunks(plan_versions(plan_ids), chunk_size):
+        warmed += len(cached_plan_dicts(chunk))
+    return warmed
+
+
+def invalidate_plan_cache(plan_ids=None):
+    """Сбрасывает деревья планов plan_ids; без plan_ids - весь кеш планов."""
+    if plan_ids is None:
+        plan_cache().clear()
+    else:
+        plan_cache().delete_many([plan_cache_key(plan_id) for plan_id in plan_ids])
@@ -0,0 +1,115 @@
+import cProfile
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.db import connection
+
+
+class QueryCounter:
+    """Обертка execute_wrapper: считает SQL-запросы и их суммарное время."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - start
+
+
+class StageProfiler:
+    """
+    Замеряет этапы импорта: время по часам и процессорное время, пик памяти
+    (tracemalloc), число и время SQL-запросов и число обработанных
+    элементов. Выключенный профайлер ничего не замеряет, поэтому этапы
+    можно оборачивать всегда.
+    cprofile_stage - имя этапа, для которого статистика cProfile
+    сохраняется в cprofile_path (формат pstats).
+    """
+
+    def __init__(self, enabled=True, cprofile_stage=None, cprofile_path=None):
+        self.enabled = enabled
+        self.cprofile_stage = cprofile_stage
+        self.cprofile_path = cprofile_path or f"{cprofile_stage}.prof"
+        self.stages = []
+        self.started = None
+
+    @contextmanager
+    def stage(self, name):
+        """
+        Оборачивает этап импорта. Отдает словарь этапа, в который вызывающий
+        код записывает число элементов: record['items'] = ...
+        """
+        record = {'stage': name, 'items': None}
+        if not self.enabled:
+            yield record
+            return
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if self.started is None:
+            self.started = time.perf_counter()
+        tracemalloc.reset_peak()
+        memory_before, _ = tracemalloc.get_traced_memory()
+
+        profile = cProfile.Profile() if name == self.cprofile_stage else None
+        queries = QueryCounter()
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        if profile:
+            profile.enable()
+        try:
+            with connection.execute_wrapper(queries):
+                yield record
+        finally:
+            if profile:
+                profile.disable()
+                profile.dump_stats(self.cprofile_path)
+                record['cprofile'] = self.cprofile_path
+            _, peak = tracemalloc.get_traced_memory()
+            record.update({
+                'wall_seconds': round(time.perf_counter() - wall_start, 4),
+                'cpu_seconds': round(time.process_time() - cpu_start, 4),
+                'peak_memory_mb': round(max(peak - memory_before, 0) / 1024 / 1024, 2),
+                'queries': queries.count,
+                'query_seconds': round(queries.seconds, 4),
+            })
+            self.stages.append(record)
+
+    def query_counts(self):
+        """Возвращает число SQL-запросов по этапам: {этап: запросы}."""
+        counts = {}
+        for stage in self.stages:
+            counts[stage['stage']] = counts.get(stage['stage'], 0) + stage['queries']
+        return counts
+
+    def report(self):
+        """Возвращает сводку по этапам для вывода в JSON."""
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+        return {
+            'stages': self.stages,
+            'total_wall_seconds': round(time.perf_counter() - self.started, 4) if self.started else 0,
+            'total_cpu_seconds': round(sum(stage['cpu_seconds'] for stage in self.stages), 4),
+            'total_queries': sum(stage['queries'] for stage in self.stages),
+        }
+
+
+def assert_query_budgets(profiler, budgets):
+    """
+    Проверяет, что этапы уложились в бюджет SQL-запросов {этап: максимум}.
+    Этапы без бюджета не проверяются. Бросает AssertionError со списком
+    превысивших этапов (для тестов и прогонов бенчмарков).
+    """
+    exceeded = [
+        f"{stage}: {count} запросов при бюджете {budgets[stage]}"
+        for stage, count in profiler.query_counts().items()
+        if stage in budgets and count > budgets[stage]
+    ]
+    if exceeded:
+        raise AssertionError("Превышен бюджет SQL-запросов:\n" + "\n".join(exceeded))
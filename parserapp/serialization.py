@@ -0,0 +1,77 @@
+from parserapp.models import StudyPlan
+
+
+def plan_queryset():
+    """
+    Учебные планы с предзагруженным деревом: категории, циклы, модули,
+    дисциплины и ячейки часов забираются по одному запросу на уровень.
+    """
+    return StudyPlan.objects.prefetch_related(
+        'cycles__child_cycles__plan_strings__clock_cells',
+        'cycles__child_cycles__plan_strings__child_plan_strings__clock_cells',
+    )
+
+
+def clock_cell_to_dict(clock, parent_string_id):
+    return {
+        "id": str(clock.id),
+        "code_of_type_work": clock.code_of_type_work,
+        "code_of_type_hours": clock.code_of_type_hours,
+        "course": clock.course,
+        "term": clock.semestr,
+        "count_of_clocks": clock.count_of_clocks,
+        "parent_string_id": str(parent_string_id)
+    }
+
+
+def plan_to_dict(study_plan):
+    """
+    Сериализует учебный план в JSON-структуру исходного формата.
+    Дерево берется из предзагрузки plan_queryset, новых запросов нет.
+    """
+    study_plan_dict = {
+        "id": str(study_plan.id),
+        "specialization_code": study_plan.specialization_code,
+        "qualification": study_plan.qualification,
+        "admission_year": study_plan.admission_year,
+        "create_date": str(study_plan.create_date),
+        "stady_plan": []
+    }
+    for category in study_plan.cycles.all():
+        category_dict = {
+            "id": str(category.id),
+            "identificator": category.identificator,
+            "cycles": category.cycles,
+            "children": []
+        }
+        for study_cycle in category.child_cycles.all():
+            study_cycle_dict = {
+                "id": str(study_cycle.id),
+                "identificator": study_cycle.identificator,
+                "cycles": study_cycle.cycles,
+                "parent_id": str(study_cycle.category_id),
+                "plans_of_string": []
+            }
+            for module in study_cycle.plan_strings.all():
+                module_dict = {
+                    "id": str(module.id),
+                    "discipline": module.name,
+                    "code_of_cycle_block": str(study_cycle.id),
+                    # Clock cells, прикрепленные к модулю
+                    "clock_cells": [clock_cell_to_dict(clock, module.id) for clock in module.clock_cells.all()],
+                    "children_strings": []
+                }
+                for disipline in module.child_plan_strings.all():
+                    module_dict["children_strings"].append({
+                        "id": str(disipline.id),
+                        "discipline": disipline.name,
+                        "code_of_cycle_block": str(study_cycle.id),
+                        "parent_string_id": str(module.id),
+                        "clock_cells": [
+                            clock_cell_to_dict(clock, disipline.id) for clock in disipline.clock_cells.all()
+                        ]
+                    })
+                study_cycle_dict["plans_of_string"].append(module_dict)
+            category_dict["children"].append(study_cycle_dict)
+        study_plan_dict["stady_plan"].append(category_dict)
+    return study_plan_dict
@@ -0,0 +1,18 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from parserapp.models import StudyPlan, WhitelistWord
+from parserapp.models_loader import plans_written
+from parserapp.plan_cache import invalidate_plan_cache
+from parserapp.validators import whitelist_cache
+
+
+@receiver([post_save, post_delete], sender=WhitelistWord)
+def invalidate_whitelist(sender, **kwargs):
+    """Сбрасывает кеш вайтлиста при добавлении, изменении или удалении слова."""
+    whitelist_cache.invalidate()
+
+
+@receiver(plans_written, sender=StudyPlan)
+def invalidate_written_plans(sender, plan_ids, **kwargs):
+    """Сбрасывает закешированные деревья планов, записанных загрузчиком."""
+    invalidate_plan_cache(plan_ids)
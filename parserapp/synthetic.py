@@ -0,0 +1,134 @@
+import random
+from xml.sax.saxutils import quoteattr
+
+from parserapp.parser import RUP_parser, HOURS_TYPE, TRUE_TYPE_OF_WORKS
+
+# Слова для названий строк плана: прилагательное + существительное
+ADJECTIVES = [
+    "Основы", "Теория", "Практика", "Технология", "Методы", "Введение", "История", "Проектирование",
+    "Разработка", "Поддержка", "Анализ", "Организация", "Моделирование", "Обеспечение", "Сопровождение",
+]
+NOUNS = [
+    "программирования", "философии", "математики", "информатики", "экономики", "систем", "сетей",
+    "алгоритмов", "данных", "приложений", "модулей", "документации", "безопасности", "управления",
+    "тестирования", "интерфейсов",
+]
+
+# Каждое N-е название получает опечатку, чтобы проверке орфографии было что находить
+TYPO_EVERY = 17
+
+# Виды работ, из которых складывается итог семестра в синтетических часах
+COMPONENT_WORKS = ('Лекционные занятия', 'Практические занятия')
+
+
+def plan_size(filename: str):
+    """Возвращает размер плана: число циклов, строк плана и записей часов."""
+    parser = RUP_parser(filename, streaming=True)
+    parser.get_elements_from_file()
+    return {
+        'cycles': len(parser.plany_ciclov) + len(parser.plany_ciclov_childs),
+        'strings': len(parser.plany_stroky) + len(parser.plany_stroky_childs),
+        'hours': len(parser.plany_novie_chasy),
+    }
+
+
+def row(tag, index, **attrib):
+    """Строка таблицы dsMMISDB с атрибутами diffgram, как в выгрузке."""
+    attributes = " ".join(f"{name}={quoteattr(str(value))}" for name, value in attrib.items())
+    return f'      <{tag} diffgr:id="{tag}{index + 1}" msdata:rowOrder="{index}" {attributes} />\n'
+
+
+def discipline_name(rng, number):
+    name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}"
+    if number % TYPO_EVERY == 0:
+        # Переставляем две соседние буквы во втором слове
+        position = len(name) - 3
+        name = name[:position] + name[position + 1] + name[position] + name[position + 2:]
+    return name
+
+
+def generate_plx(path: str, cycles: int, strings: int, hours: int, seed: int = 0):
+    """
+    Записывает синтетический план в формате .plx (UTF-16, dsMMISDB):
+    cycles циклов (около трети - верхнего уровня), strings строк плана
+    (модуль и две его дисциплины по очереди) и около hours записей часов
+    (лекции, практика и их итог за семестр, поэтому часы сходятся).
+    Одинаковый seed дает одинаковый файл; шифр специальности и год набора
+    выводятся из seed, поэтому планы с разными seed различаются и по
+    естественному ключу, и по идентичности stable_ids.
+    Возвращает фактические размеры плана в виде plan_size.
+    """
+    rng = random.Random(seed)
+    courses, terms = 4, 2
+    work_codes = {work: code for code, work in enumerate(sorted(TRUE_TYPE_OF_WORKS), start=1)}
+
+    rows = [
+        row("ООП", 0, Код=1, Шифр=f"09.02.{seed:02d}", Название="СИНТЕТИЧЕСКИЙ ПЛАН", ТипГОСа=4),
+        row("Планы", 0, Код=-1, Квалификация="Программист", ГодНачалаПодготовки=2020 + seed % 10,
+            СрокОбучения=courses - 1, СрокОбученияМесяцев=10, СеместровНаКурсе=terms, КурсНачалаОбуч=1),
+        row("СправочникТипаЧасов", 0, Код=1, Наименование=HOURS_TYPE),
+    ]
+    rows.extend(
+        row("СправочникВидыРабот", index, Код=code, Название=work)
+        for index, (work, code) in enumerate(work_codes.items())
+    )
+
+    top_cycles = max(1, round(cycles * 0.3))
+    blocks = []
+    for index in range(max(cycles, top_cycles + 1)):
+        code = -(index + 1)
+        if index < top_cycles:
+            rows.append(row("ПланыЦиклы", index, Код=code, Идентификатор=f"Ц{index + 1}", Цикл=f"ЦИКЛ {index + 1}"))
+        else:
+            parent = -(index % top_cycles + 1)
+            rows.append(row(
+                "ПланыЦиклы", index, Код=code, КодРодителя=parent,
+                Идентификатор=f"Ц{index + 1}", Цикл=discipline_name(rng, index + 1)
+            ))
+            blocks.append(code)
+
+    module_code = module_number = child_number = 0
+    for index in range(strings):
+        code = -(index + 1)
+        block = blocks[(index // 3) % len(blocks)]
+        if index % 3 == 0:
+            module_code, module_number, child_number = code, module_number + 1, 0
+            rows.append(row(
+                "ПланыСтроки", index, Код=code, КодБлока=block,
+                Дисциплина=discipline_name(rng, index + 1), ДисциплинаКод=f"ПМ.{module_number:02d}"
+            ))
+        else:
+            child_number += 1
+            rows.append(row(
+                "ПланыСтроки", index, Код=code, КодБлока=block, КодРодителя=module_code,
+                Дисциплина=discipline_name(rng, index + 1),
+                ДисциплинаКод=f"МДК.{module_number:02d}.{child_number:02d}"
+            ))
+
+    hour_index = 0
+    for group in range(hours // (len(COMPONENT_WORKS) + 1)):
+        slot = group // strings
+        counts = [rng.randrange(2, 40) * 2 for _ in COMPONENT_WORKS]
+        records = list(zip(COMPONENT_WORKS, counts)) + [('Итого часов', sum(counts))]
+        for work, count in records:
+            rows.append(row(
+                "ПланыНовыеЧасы", hour_index, Код=-(hour_index + 1), КодОбъекта=-(group % strings + 1),
+                КодВидаРаботы=work_codes[work], КодТипаЧасов=1,
+                Курс=slot // terms + 1, Семестр=slot % terms + 1, Количество=count
+            ))
+            hour_index += 1
+
+    with open(path, "w", encoding="utf-16") as file:
+        file.write('<?xml version="1.0" encoding="utf-16"?>\n')
+        file.write(f'<Документ Тип="РАБОЧИЙ УЧЕБНЫЙ ПЛАН" СеместровНаКурсе="{terms}">\n')
+        file.write(
+            '  <diffgr:diffgram xmlns:msdata="urn:schemas-microsoft-com:xml-msdata" '
+            'xmlns:diffgr="urn:schemas-microsoft-com:xml-diffgram-v1">\n'
+        )
+        file.write('    <dsMMISDB xmlns="http://tempuri.org/dsMMISDB.xsd">\n')
+        file.writelines(rows)
+        file.write('    </dsMMISDB>\n')
+        file.write('  </diffgr:diffgram>\n')
+        file.write('</Документ>\n')
+
+    return plan_size(path)
@@ -1,3 +1,991 @@
-from django.test import TestCase
+import contextlib
+import io
+import json
+import os
+import re
+import tempfile
+import uuid
+from importlib.util import find_spec
+from unittest import mock, skipUnless
+from datetime import timedelta
 
-# Create your tests here.
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from parserapp.benchmarks import run_pipeline
+from parserapp.main import models_to_json, models_to_json_files
+from parserapp.management.commands.runparser import Command
+from parserapp.models import (
+    StudyPlan, Category, StudyCycle, Module, Disipline, ClockCell, SpellCheckResult, WhitelistWord
+)
+from parserapp.models_loader import (
+    PLAN_MODELS, collect_plan_strings, collect_texts, load_json_to_models, load_json_to_models_bulk, plans_written,
+    upsert_json_to_models
+)
+from parserapp.hours import HourMatrix, plan_to_json
+from parserapp.parser import HOURS_TYPE, RUP_parser, parse_plan
+from parserapp.plan_cache import get_plan_dict, invalidate_plan_cache, plan_cache, plan_cache_key, warm_plan_cache
+from parserapp.profiling import StageProfiler, assert_query_budgets
+from parserapp.serialization import plan_queryset, plan_to_dict
+from parserapp.synthetic import generate_plx
+from parserapp.validators import (
+    WORD_RE, AutocorrectSpellerBackend, DisciplineIndexValidator, SpellCache, SpellerBackend, WhitelistIndex,
+    add_to_whitelist, evict_spell_cache, normalize_word, read_whitelist_file, validate_plan_hours, validate_texts,
+    whitelist_cache, write_whitelist_file
+)
+
+
+class DisciplineIndexValidatorTests(SimpleTestCase):
+    # (индекс, ожидаемые ошибки) - проверяются по порядку с общим состоянием плана
+    SEQUENCE_CASES = [
+        ("УП.1", None),
+        ("УП.2", None),
+        ("УП.4", ["Неверная последовательность индекса 'УП.4'. Ожидается 'УП.3'."]),
+        ("УП.01", None),
+        ("УП.02", None),
+        ("УП.04", ["Неверная последовательность индекса 'УП.04'. Ожидается 'УП.03'."]),
+        ("УП.1.1", None),
+        ("УП.1.2", None),
+        ("УП.1.4", ["Неверная последовательность индекса 'УП.1.4'. Ожидается 'УП.1.3'."]),
+        ("УП.01.01", None),
+        ("УП.01.02", None),
+        ("УП.01.04", ["Неверная последовательность индекса 'УП.01.04'. Ожидается 'УП.01.03'."]),
+        ("УП.3", None),  # Should work after two-part indices in single-digit format
+        ("УП.03", None),  # Should work after two-part indices in double-digit format
+        ("ОП.1", None),
+        ("ОП.01", None),
+    ]
+
+    def test_sequence(self):
+        validator = DisciplineIndexValidator()
+        state = {}
+        for index, expected in self.SEQUENCE_CASES:
+            with self.subTest(index=index):
+                self.assertEqual(validator.check(index, state), expected)
+
+    def test_validate_plan_matches_sequential_checks(self):
+        indices_by_module = {
+            'module-1': [index for index, _ in self.SEQUENCE_CASES[:8]],
+            'module-2': [index for index, _ in self.SEQUENCE_CASES[8:]],
+        }
+        result = DisciplineIndexValidator().validate_plan(indices_by_module)
+        self.assertEqual(
+            result['module-1'] + result['module-2'],
+            [expected for _, expected in self.SEQUENCE_CASES],
+        )
+
+    def test_format_errors(self):
+        cases = [
+            (None, ["Индекс дисциплины отсутствует."]),
+            ("  МДК.01.01", None),
+            ("ПM.01.ЭК", ["Неверный формат индекса 'ПM.01.ЭК'. Ожидается формат 'Префикс.Число' или 'Префикс.Число.Число'."]),
+            ("МДК.01.02.03", ["Неверный формат индекса 'МДК.01.02.03'. Ожидается формат 'Префикс.Число' или 'Префикс.Число.Число'."]),
+            ("МДК.02.02", ["Неверная последовательность индекса 'МДК.02.02'. Ожидается 'МДК.02.01'."]),
+        ]
+        validator = DisciplineIndexValidator()
+        for index, expected in cases:
+            with self.subTest(index=index):
+                self.assertEqual(validator.check(index, {}), expected)
+
+    def test_prefix_registry(self):
+        validator = DisciplineIndexValidator(("ОП", "УП"))
+        self.assertIsNone(validator.check("ОП.01", {}))
+        self.assertEqual(
+            validator.check("ГИА.01", {}),
+            ["Недопустимый префикс 'ГИА' в индексе 'ГИА.01'. Допустимые префиксы: ОП, УП."],
+        )
+
+    def test_single_part_after_two_part(self):
+        validator = DisciplineIndexValidator()
+        state = {}
+        validator.check("УП.01.01", state)
+        self.assertEqual(
+            validator.check("УП.01", state),
+            ["Неверная последовательность индекса 'УП.01'. Индекс с одной цифрой не может идти после индекса с двумя."],
+        )
+
+
+class PlanHoursValidationTests(SimpleTestCase):
+    WORKS = ('Итого часов', 'Лекционные занятия', 'Практические занятия')
+
+    def hour_matrix(self, cells_by_string):
+        """HourMatrix по {id строки: [(курс, семестр, вид работы, часы)]}."""
+        hours = HourMatrix(self.WORKS, courses=2, terms=2, hours_type=HOURS_TYPE)
+        for string_id, cells in cells_by_string.items():
+            row = hours.add_string(string_id, string_id)
+            for course, term, work, count in cells:
+                hours.add_cell(row, course, term, work, count, str(uuid.uuid4()))
+        return hours.freeze()
+
+    def test_all_mismatching_terms_of_modules_and_disciplines(self):
+        hours = self.hour_matrix({
+            'module': [
+                (1, 1, 'Лекционные занятия', 10), (1, 1, 'Практические занятия', 10), (1, 1, 'Итого часов', 20),
+                (1, 2, 'Лекционные занятия', 10), (1, 2, 'Практические занятия', 6), (1, 2, 'Итого часов', 20),
+                (2, 1, 'Лекционные занятия', 8),
+            ],
+            'discipline': [
+                (2, 2, 'Лекционные занятия', 4), (2, 2, 'Практические занятия', 4), (2, 2, 'Итого часов', 10),
+            ],
+            'consistent': [
+                (1, 1, 'Лекционные занятия', 6), (1, 1, 'Итого часов', 6),
+            ],
+        })
+        plan_strings = [
+            ('module', {'id': 'module', 'discipline': "Модуль"}),
+            ('discipline', {'id': 'discipline', 'discipline': "Дисциплина"}),
+            ('discipline', {'id': 'consistent', 'discipline': "Без ошибок"}),
+        ]
+        self.assertEqual(validate_plan_hours(hours, plan_strings), {
+            'module': [
+                "Сумма часов по ячейкам (16) не совпадает с итоговым количеством часов (20) "
+                "за семестр 2 курса 1 у модуля 'Модуль'.",
+                "Сумма часов по ячейкам (8) не совпадает с итоговым количеством часов (0) "
+                "за семестр 1 курса 2 у модуля 'Модуль'.",
+            ],
+            'discipline': [
+                "Сумма часов по ячейкам (8) не совпадает с итоговым количеством часов (10) "
+                "за семестр 2 курса 2 у дисциплины 'Дисциплина'.",
+            ],
+        })
+
+    def test_consistent_plan_has_no_warnings(self):
+        rup_data = parse_synthetic_plan(1)
+        self.assertTrue(rup_data['hours'].cell_positions.size)
+        self.assertEqual(validate_plan_hours(rup_data['hours'], collect_plan_strings(rup_data)), {})
+
+
+class WhitelistMatchingTests(SimpleTestCase):
+    """Сопоставление с вайтлистом через упрощенный стемминг (без pymorphy)."""
+
+    def setUp(self):
+        patcher = mock.patch('parserapp.validators.get_morph_analyzer', return_value=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        normalize_word.cache_clear()
+        self.addCleanup(normalize_word.cache_clear)
+
+    def test_inflected_forms_match(self):
+        whitelist = WhitelistIndex(["программирование", "кот", "информационные", "ёлка"])
+        for word in ("программирование", "Программирования", "программированием", "программированию",
+                     "кота", "котом", "информационных", "Ёлки", "елке"):
+            with self.subTest(word=word):
+                self.assertIn(word, whitelist)
+
+    def test_shared_prefix_does_not_match(self):
+        whitelist = WhitelistIndex(["кот", "стол", "информационные"])
+        for word in ("котлета", "столица", "информатика", "ко"):
+            with self.subTest(word=word):
+                self.assertNotIn(word, whitelist)
+
+    def test_short_stem_keeps_ending(self):
+        # Окончание не отбрасывается, если от слова остается меньше MIN_STEM_LENGTH букв
+        self.assertEqual(normalize_word("мая"), "мая")
+        self.assertNotIn("мои", WhitelistIndex(["моя"]))
+
+
+class WhitelistCacheTests(TestCase):
+    """Кеш вайтлиста сбрасывается при любом изменении слов, без перезапуска процесса."""
+
+    def setUp(self):
+        whitelist_cache.invalidate()
+        self.addCleanup(whitelist_cache.invalidate)
+        self.speller = FlagWordSpeller("опечатка")
+
+    def warnings(self):
+        return validate_texts(["Опечатка в названии"], self.speller)["Опечатка в названии"]
+
+    def assert_reloaded_once(self, change, whitelisted):
+        """Выполняет change и проверяет, что следующая проверка перечитала вайтлист один раз."""
+        self.warnings()
+        queries = whitelist_cache.queries
+        change()
+        if whitelisted:
+            self.assertIsNone(self.warnings())
+        else:
+            self.assertTrue(self.warnings())
+        self.warnings()
+        self.assertEqual(whitelist_cache.queries, queries + 1)
+
+    def test_post_save(self):
+        self.assert_reloaded_once(lambda: WhitelistWord.objects.create(word="опечатка"), whitelisted=True)
+
+        word = WhitelistWord.objects.get()
+        word.word = "другое"
+        self.assert_reloaded_once(word.save, whitelisted=False)
+
+    def test_post_delete(self):
+        word = WhitelistWord.objects.create(word="опечатка")
+        self.assertIsNone(self.warnings())
+        self.assert_reloaded_once(word.delete, whitelisted=False)
+
+    def test_add_to_whitelist(self):
+        # bulk_create не отправляет post_save: кеш сбрасывает сам add_to_whitelist
+        self.assert_reloaded_once(lambda: add_to_whitelist(["Опечатка"]), whitelisted=True)
+
+
+class WhitelistFileTests(TestCase):
+    def setUp(self):
+        whitelist_cache.invalidate()
+        self.addCleanup(whitelist_cache.invalidate)
+
+    def test_import_export_round_trip(self):
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "whitelist.txt")
+            with open(source, "w", encoding="utf-8") as file:
+                file.write("# термины\nМДК\n\nпрофессиональный  # модуль\nкот\nкот\n")
+            words = read_whitelist_file(source)
+            self.assertEqual(words, ["МДК", "профессиональный", "кот", "кот"])
+            self.assertEqual(add_to_whitelist(words), 3)
+
+            exported = os.path.join(directory, "exported.txt")
+            self.assertEqual(write_whitelist_file(exported), 3)
+            self.assertEqual(read_whitelist_file(exported), ["кот", "мдк", "профессиональный"])
+
+            # Повторный импорт выгрузки ничего не добавляет
+            self.assertEqual(add_to_whitelist(read_whitelist_file(exported)), 0)
+            second_export = os.path.join(directory, "second.txt")
+            write_whitelist_file(second_export)
+            with open(exported, encoding="utf-8") as first, open(second_export, encoding="utf-8") as second:
+                self.assertEqual(first.read(), second.read())
+        self.assertEqual(set(WhitelistWord.objects.values_list('word', flat=True)), {"кот", "мдк", "профессиональный"})
+
+
+class NoErrorsSpeller(SpellerBackend):
+    """Бэкенд орфографии без ошибок: тест не зависит от сети и словарей."""
+    name = 'no-errors'
+    version = 'no-errors-1'
+
+    def spell(self, text):
+        return []
+
+
+class FlagWordSpeller(SpellerBackend):
+    """Бэкенд орфографии, который считает ошибкой только слово word (в любом регистре)."""
+    name = 'flag-word'
+
+    def __init__(self, word):
+        self.word = word
+        self.version = f"flag-word-{word}-1"
+
+    def spell(self, text):
+        return [{'word': word, 's': [word.lower()]} for word in WORD_RE.findall(text) if word.lower() == self.word]
+
+
+class CountingSpeller(SpellerBackend):
+    """Бэкенд орфографии, который запоминает проверенные тексты и считает ошибкой каждый текст."""
+    name = 'counting'
+
+    def __init__(self, version="counting-1"):
+        self.version = version
+        self.calls = []
+
+    def spell(self, text):
+        self.calls.append(text)
+        return [{'word': text, 's': [text.upper()]}]
+
+
+class SpellCacheTests(TestCase):
+    def setUp(self):
+        self.cache = SpellCache(maxsize=2)
+        self.speller = CountingSpeller()
+
+    def test_repeat_text_is_served_from_memory(self):
+        changes = self.cache.spell(self.speller, "текст")
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.spell(self.speller, " текст "), changes)
+            self.assertEqual(self.cache.spell_many(self.speller, ["текст"]), {"текст": changes})
+        self.assertEqual(self.speller.calls, ["текст"])
+
+    def test_cleared_memory_is_refilled_from_database(self):
+        changes = self.cache.spell_many(self.speller, ["первый", "второй"])
+        self.cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.spell(self.speller, "первый"), changes["первый"])
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.spell_many(self.speller, ["первый", "второй"]), changes)
+        self.assertEqual(self.speller.calls, ["первый", "второй"])
+
+    def test_memory_keeps_maxsize_most_recent_texts(self):
+        for text in ("первый", "второй", "третий"):
+            self.cache.spell(self.speller, text)
+        self.assertEqual(
+            list(self.cache.entries), [("counting-1", "второй"), ("counting-1", "третий")]
+        )
+        # Вытесненный из памяти текст берется из БД, а не из бэкенда
+        self.cache.spell(self.speller, "первый")
+        self.assertEqual(self.speller.calls, ["первый", "второй", "третий"])
+
+    def test_results_are_keyed_by_backend_version(self):
+        other = CountingSpeller(version="counting-2")
+        self.cache.spell(self.speller, "текст")
+        self.cache.clear()
+        self.cache.spell(other, "текст")
+        self.assertEqual((self.speller.calls, other.calls), (["текст"], ["текст"]))
+        self.assertEqual(
+            sorted(SpellCheckResult.objects.values_list('backend_version', 'text')),
+            [("counting-1", "текст"), ("counting-2", "текст")],
+        )
+
+    def test_evict_by_age(self):
+        self.cache.spell_many(self.speller, ["старый", "новый"])
+        SpellCheckResult.objects.filter(text="старый").update(created_at=timezone.now() - timedelta(days=31))
+        self.assertEqual(evict_spell_cache(max_entries=100, max_age_days=30), 1)
+        self.assertEqual(list(SpellCheckResult.objects.values_list('text', flat=True)), ["новый"])
+
+    def test_evict_by_count_removes_oldest(self):
+        texts = ["первый", "второй", "третий", "четвертый", "пятый"]
+        self.cache.spell_many(self.speller, texts)
+        now = timezone.now()
+        for age, text in enumerate(reversed(texts)):
+            SpellCheckResult.objects.filter(text=text).update(created_at=now - timedelta(hours=age))
+        self.assertEqual(evict_spell_cache(max_entries=2, max_age_days=30), 3)
+        self.assertEqual(
+            sorted(SpellCheckResult.objects.values_list('text', flat=True)), sorted(["четвертый", "пятый"])
+        )
+
+
+# Учебный план из репозитория, на котором проверяется разбор
+SAMPLE_PLAN = os.path.join(os.path.dirname(__file__), "gg.plx")
+
+# Кеш планов в памяти процесса, чтобы тесты не писали файловый кеш проекта
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+    'plans': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'test-plans'},
+}
+
+
+def parse_synthetic_plan(seed, cycles=4, strings=12, hours=60):
+    """Разбирает синтетический план seed (id узлов - новые uuid4 при каждом вызове)."""
+    with tempfile.TemporaryDirectory() as directory:
+        plan_file = os.path.join(directory, f"plan_{seed}.plx")
+        generate_plx(plan_file, cycles, strings, hours, seed=seed)
+        return parse_plan(plan_file)
+
+
+def load_synthetic_plans(seeds, cycles=4, strings=12, hours=60):
+    """
+    Загружает в БД по синтетическому плану на каждый seed без очистки
+    таблиц. Возвращает словари rup загруженных планов.
+    """
+    plans = []
+    with contextlib.redirect_stdout(io.StringIO()):
+        for seed in seeds:
+            rup_data = parse_synthetic_plan(seed, cycles, strings, hours)
+            text_warnings = validate_texts(collect_texts(rup_data), NoErrorsSpeller())
+            load_json_to_models_bulk(rup_data, clear=False, text_warnings=text_warnings)
+            plans.append(rup_data)
+    return plans
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryBudgetTests(TestCase):
+    # Синтетический план размером с gg.plx: циклы, строки плана, записи часов
+    FIXTURE_SIZE = {'cycles': 10, 'strings': 61, 'hours': 472}
+
+    # Бюджет SQL-запросов по этапам импорта для FIXTURE_SIZE
+    QUERY_BUDGETS = {
+        'get_elements_from_file': 0,
+        'build_tree': 0,
+        'validation': 3,
+        'load_json_to_models': 17,
+        'models_to_json': 8,
+        'print_model_data': 6,
+    }
+
+    def setUp(self):
+        invalidate_plan_cache()
+
+    def run_fixture_pipeline(self):
+        profiler = StageProfiler()
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+            plan_file = os.path.join(directory, "fixture.plx")
+            generate_plx(plan_file, **self.FIXTURE_SIZE)
+            run_pipeline(plan_file, profiler, NoErrorsSpeller(), os.path.join(directory, "exported_plan.json"))
+            with profiler.stage('print_model_data'):
+                Command().print_model_data()
+        profiler.report()
+        return profiler
+
+    def test_pipeline_query_budgets(self):
+        profiler = self.run_fixture_pipeline()
+        assert_query_budgets(profiler, self.QUERY_BUDGETS)
+
+    def test_budget_violation_is_reported(self):
+        profiler = self.run_fixture_pipeline()
+        with self.assertRaisesMessage(AssertionError, "load_json_to_models"):
+            assert_query_budgets(profiler, {'load_json_to_models': 0})
+
+    def load_extra_plans(self, count):
+        """Дозагружает в БД count синтетических планов без очистки таблиц."""
+        load_synthetic_plans(range(1, count + 1), **self.FIXTURE_SIZE)
+
+    def export_queries(self, **kwargs):
+        # Замеряется выгрузка с пустым кешем планов
+        invalidate_plan_cache()
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+            with CaptureQueriesContext(connection) as queries:
+                exported = models_to_json(os.path.join(directory, "exported_plan.json"), **kwargs)
+        return exported, len(queries)
+
+    def test_export_queries_do_not_grow_with_plans(self):
+        self.run_fixture_pipeline()
+        _, single_plan_queries = self.export_queries()
+        self.load_extra_plans(2)
+        exported, queries = self.export_queries()
+        self.assertEqual(exported, 3)
+        self.assertEqual(queries, single_plan_queries)
+        # Запрос планов один, каждая пачка добавляет по запросу на уровень дерева
+        exported, queries = self.export_queries(chunk_size=2)
+        self.assertEqual(queries, 1 + 2 * (single_plan_queries - 1))
+
+    def test_export_is_valid_json_in_both_formats(self):
+        self.run_fixture_pipeline()
+        self.load_extra_plans(1)
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+            indented_path = os.path.join(directory, "indented.json")
+            compact_path = os.path.join(directory, "compact.json")
+            models_to_json(indented_path)
+            models_to_json(compact_path, indent=None)
+            with open(indented_path, encoding="utf-8") as indented, open(compact_path, encoding="utf-8") as compact:
+                indented_text, compact_text = indented.read(), compact.read()
+        self.assertEqual(json.loads(indented_text), json.loads(compact_text))
+        self.assertEqual(len(json.loads(compact_text)), 2)
+        self.assertLess(len(compact_text), len(indented_text))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PlanExportFilterTests(TestCase):
+    def setUp(self):
+        invalidate_plan_cache()
+        self.first, self.second = load_synthetic_plans([1, 2])
+        self.directory = self.enterContext(tempfile.TemporaryDirectory())
+
+    def export(self, **kwargs):
+        path = os.path.join(self.directory, "exported_plan.json")
+        with contextlib.redirect_stdout(io.StringIO()):
+            models_to_json(path, **kwargs)
+        with open(path, encoding="utf-8") as file:
+            return [plan['id'] for plan in json.load(file)]
+
+    def test_export_by_plan_ids(self):
+        self.assertEqual(self.export(plan_ids=[self.second['id']]), [self.second['id']])
+        self.assertCountEqual(self.export(), [self.first['id'], self.second['id']])
+
+    def test_export_changed_since(self):
+        now = timezone.now()
+        StudyPlan.objects.filter(id=self.first['id']).update(updated_at=now - timedelta(days=2))
+        self.assertEqual(self.export(changed_since=now - timedelta(days=1)), [self.second['id']])
+        self.assertEqual(self.export(changed_since=now + timedelta(days=1)), [])
+
+    def test_upsert_touches_plan_only_on_changes(self):
+        StudyPlan.objects.update(updated_at=timezone.now() - timedelta(days=2))
+        since = timezone.now() - timedelta(days=1)
+        with contextlib.redirect_stdout(io.StringIO()):
+            upsert_json_to_models(self.first, text_warnings={})
+        self.assertEqual(self.export(changed_since=since), [])
+        with contextlib.redirect_stdout(io.StringIO()):
+            upsert_json_to_models(dict(self.first, qualification="Другая квалификация"), text_warnings={})
+        self.assertEqual(self.export(changed_since=since), [self.first['id']])
+
+    def test_one_file_per_plan(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            paths = models_to_json_files(self.directory, plan_ids=[self.first['id']], indent=None)
+        self.assertEqual([path.name for path in paths], [f"{self.first['id']}.json"])
+        with open(paths[0], encoding="utf-8") as file:
+            self.assertEqual(json.load(file)['id'], self.first['id'])
+
+
+class PrintModelDataTests(TestCase):
+    def setUp(self):
+        self.first, self.second = load_synthetic_plans([1, 2])
+        self.warned = Disipline.objects.filter(module__studey_cycle__category__study_plan=self.first['id']).first()
+        self.warned.warnings = True
+        self.warned.warning_description = ["Тестовое предупреждение"]
+        self.warned.save()
+
+    def report(self, **kwargs):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output), CaptureQueriesContext(connection) as queries:
+            Command().print_model_data(**kwargs)
+        return output.getvalue(), len(queries)
+
+    def test_full_report_uses_query_per_level(self):
+        text, queries = self.report()
+        self.assertEqual(queries, 6)
+        self.assertIn(self.first['id'], text)
+        self.assertIn(self.second['id'], text)
+        self.assertIn("⏱", text)
+
+    def test_plan_and_depth(self):
+        text, queries = self.report(plan_id=self.first['id'], depth=2)
+        self.assertEqual(queries, 2)
+        self.assertNotIn(self.second['id'], text)
+        self.assertIn("Категория", text)
+        self.assertNotIn("Учебный цикл", text)
+
+    def test_warnings_only_keeps_ancestors(self):
+        text, _ = self.report(warnings_only=True)
+        self.assertIn(self.first['id'], text)
+        self.assertNotIn(self.second['id'], text)
+        self.assertEqual(text.count("└─ Дисциплина:"), 1)
+        self.assertIn("Тестовое предупреждение", text)
+
+    def test_summary(self):
+        text, queries = self.report(plan_id=self.first['id'], summary=True)
+        self.assertEqual(queries, 6)
+        self.assertIn("Учебные планы: 1, с предупреждениями: 0", text)
+        self.assertIn("с предупреждениями: 1", text)
+        self.assertNotIn("└─", text)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PlanApiTests(TestCase):
+    def setUp(self):
+        invalidate_plan_cache()
+        self.first, self.second = load_synthetic_plans([1, 2])
+        self.disipline = Disipline.objects.filter(
+            module__studey_cycle__category__study_plan=self.first['id'], clock_cells__isnull=False
+        ).first()
+
+    def get(self, url, etag=None):
+        headers = {'If-None-Match': etag} if etag else {}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, headers=headers)
+        return response, len(queries)
+
+    def test_plan_list(self):
+        response, _ = self.get(reverse('parserapp:plan_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertCountEqual([plan['id'] for plan in response.json()], [self.first['id'], self.second['id']])
+        self.assertNotIn('stady_plan', response.json()[0])
+
+        cached, queries = self.get(reverse('parserapp:plan_list'), response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(queries, 1)
+
+    def test_plan_detail_etag_follows_plan_version(self):
+        url = reverse('parserapp:plan_detail', args=[self.first['id']])
+        response, queries = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(queries, 9)
+        self.assertEqual(response.json(), json.loads(json.dumps(plan_to_dict(plan_queryset().get(id=self.first['id'])))))
+        self.assertFalse(response['ETag'].startswith('W/'))
+
+        cached, queries = self.get(url, response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+        self.assertEqual(queries, 1)
+
+        StudyPlan.objects.filter(id=self.first['id']).update(updated_at=timezone.now() + timedelta(seconds=1))
+        changed, _ = self.get(url, response['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_discipline_clock_cells(self):
+        url = reverse('parserapp:discipline_clock_cells', args=[self.disipline.id])
+        response, _ = self.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['clock_cells']), self.disipline.clock_cells.count())
+        cached, _ = self.get(url, response['ETag'])
+        self.assertEqual(cached.status_code, 304)
+
+    def test_missing_objects_and_read_only(self):
+        self.assertEqual(self.client.get(reverse('parserapp:plan_detail', args=['missing'])).status_code, 404)
+        self.assertEqual(
+            self.client.get(reverse('parserapp:discipline_clock_cells', args=['missing'])).status_code, 404
+        )
+        self.assertEqual(self.client.post(reverse('parserapp:plan_list')).status_code, 405)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class PlanCacheTests(TestCase):
+    def setUp(self):
+        invalidate_plan_cache()
+        self.first, self.second = load_synthetic_plans([1, 2])
+
+    def test_warm_cache_serves_export_and_api(self):
+        self.assertEqual(warm_plan_cache(), 2)
+        with tempfile.TemporaryDirectory() as directory, contextlib.redirect_stdout(io.StringIO()):
+            with CaptureQueriesContext(connection) as queries:
+                models_to_json(os.path.join(directory, "exported_plan.json"))
+        self.assertEqual(len(queries), 1)
+
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('parserapp:plan_detail', args=[self.first['id']]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 2)
+
+    def test_cached_tree_matches_database(self):
+        warm_plan_cache()
+        expected = plan_to_dict(plan_queryset().get(id=self.first['id']))
+        self.assertEqual(get_plan_dict(self.first['id']), expected)
+        self.assertIsNone(get_plan_dict('missing'))
+
+    def test_entry_for_older_version_is_recomputed(self):
+        warm_plan_cache()
+        StudyPlan.objects.filter(id=self.first['id']).update(
+            qualification="Новая квалификация", updated_at=timezone.now() + timedelta(seconds=1)
+        )
+        self.assertEqual(get_plan_dict(self.first['id'])['qualification'], "Новая квалификация")
+
+    def test_legacy_loader_notifies_once_per_plan(self):
+        received = []
+
+        def receiver(sender, plan_ids, **kwargs):
+            received.append(plan_ids)
+
+        plans_written.connect(receiver)
+        self.addCleanup(plans_written.disconnect, receiver)
+        for rup_data in (parse_synthetic_plan(3), {'id': str(uuid.uuid4()), 'stady_plan': []}):
+            with self.captureOnCommitCallbacks(execute=True), contextlib.redirect_stdout(io.StringIO()), \
+                    mock.patch('parserapp.models_loader.validate_text', return_value=None):
+                load_json_to_models(rup_data, clear=False)
+            self.assertEqual(received, [[rup_data['id']]])
+            received.clear()
+
+    def test_loader_invalidates_written_plan(self):
+        warm_plan_cache()
+        key = plan_cache_key(self.first['id'])
+        self.assertIsNotNone(plan_cache().get(key))
+
+        with self.captureOnCommitCallbacks(execute=True), contextlib.redirect_stdout(io.StringIO()):
+            upsert_json_to_models(self.first, text_warnings={})
+        self.assertIsNotNone(plan_cache().get(key))
+
+        with self.captureOnCommitCallbacks(execute=True), contextlib.redirect_stdout(io.StringIO()):
+            upsert_json_to_models(dict(self.first, qualification="Другая квалификация"), text_warnings={})
+        self.assertIsNone(plan_cache().get(key))
+
+
+@override_settings(CACHES=TEST_CACHES)
+class RunparserBatchTests(TestCase):
+    def test_parse_error_aborts_before_writing(self):
+        load_synthetic_plans([1])
+        with tempfile.TemporaryDirectory() as directory:
+            generate_plx(os.path.join(directory, "good.plx"), 4, 12, 60, seed=2)
+            with open(os.path.join(directory, "broken.plx"), "w", encoding="utf-8") as file:
+                file.write("не xml")
+            with self.assertRaisesMessage(CommandError, "broken.plx"):
+                call_command('runparser', directory, '--force', stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertEqual(StudyPlan.objects.count(), 1)
+
+    def runparser(self, *args, speller=None):
+        """Запускает runparser с бэкендом орфографии speller и возвращает его вывод."""
+        speller = speller or NoErrorsSpeller()
+        stdout = io.StringIO()
+        with mock.patch(
+            'parserapp.management.commands.runparser.validate_texts', lambda texts: validate_texts(texts, speller)
+        ), contextlib.redirect_stdout(io.StringIO()):
+            call_command('runparser', *args, stdout=stdout, stderr=io.StringIO())
+        return stdout.getvalue()
+
+    def test_unchanged_files_are_revalidated_after_whitelist_change(self):
+        whitelist_cache.invalidate()
+        self.addCleanup(whitelist_cache.invalidate)
+        speller = FlagWordSpeller("цикл")
+        with tempfile.TemporaryDirectory() as directory:
+            generate_plx(os.path.join(directory, "plan.plx"), 4, 12, 60, seed=1)
+            self.runparser(directory, speller=speller)
+            plan = StudyPlan.objects.get()
+            categories = list(Category.objects.order_by('id').values())
+            self.assertTrue(categories and all(category['warnings'] for category in categories))
+
+            # Файл и настройки проверки не изменились: план не перезаписывается
+            output = self.runparser(directory, speller=speller)
+            self.assertIn("загрузка пропущена", output)
+            self.assertEqual(
+                StudyPlan.objects.values_list('id', 'updated_at').get(), (plan.id, plan.updated_at)
+            )
+            self.assertEqual(list(Category.objects.order_by('id').values()), categories)
+
+            call_command('runparser', '--add_to_whitelist', "цикл", stdout=io.StringIO())
+            output = self.runparser(directory, speller=speller)
+        self.assertNotIn("загрузка пропущена", output)
+        self.assertEqual(StudyPlan.objects.count(), 1)
+        self.assertEqual(Category.objects.count(), len(categories))
+        self.assertFalse(Category.objects.filter(warnings=True).exists())
+
+    def test_export_changed_since_keeps_unchanged_plans(self):
+        with tempfile.TemporaryDirectory() as directory, tempfile.TemporaryDirectory() as export_dir:
+            for seed in (1, 2):
+                generate_plx(os.path.join(directory, f"plan_{seed}.plx"), 4, 12, 60, seed=seed)
+            self.runparser(directory)
+            StudyPlan.objects.update(updated_at=timezone.now() - timedelta(days=2))
+            since = (timezone.now() - timedelta(days=1)).isoformat()
+
+            # Меняются часы только второго плана
+            generate_plx(os.path.join(directory, "plan_2.plx"), 4, 12, 90, seed=2)
+            self.runparser(directory, '--export_changed_since', since, '--export_dir', export_dir)
+            changed = StudyPlan.objects.get(specialization_code="09.02.02")
+            self.assertEqual(os.listdir(export_dir), [f"{changed.id}.json"])
+        self.assertEqual(StudyPlan.objects.count(), 2)
+
+
+def write_other_form_plan(directory):
+    """
+    Записывает в directory копию gg.plx с другой формой обучения (та же
+    специальность, год и квалификация) и возвращает путь к ней.
+    """
+    with open(SAMPLE_PLAN, encoding="utf-16") as file:
+        source = file.read()
+    # КодФормыОбучения есть и у Документ, поэтому замена ограничена заголовком Планы
+    other_source, replaced = re.subn(r'(<Планы [^>]*КодФормыОбучения=")1"', r'\g<1>2"', source, count=1)
+    assert replaced == 1
+    other_plan = os.path.join(directory, "other_form.plx")
+    with open(other_plan, "w", encoding="utf-16") as file:
+        file.write(other_source)
+    return other_plan
+
+
+def stable_plan_json(filename):
+    """Разбирает план со stable_ids и возвращает его JSON-вид с clock_cells."""
+    parser = RUP_parser(filename, stable_ids=True)
+    parser.get_elements_from_file()
+    parser.build_tree()
+    return plan_to_json(parser.rup, parser.make_id)
+
+
+def node_ids(node):
+    """Все id узлов вложенной JSON-структуры плана."""
+    if isinstance(node, list):
+        return [node_id for item in node for node_id in node_ids(item)]
+    if not isinstance(node, dict):
+        return []
+    own = [node['id']] if 'id' in node else []
+    return own + [node_id for value in node.values() for node_id in node_ids(value)]
+
+
+class StableIdsTests(SimpleTestCase):
+    def test_same_file_gives_same_json(self):
+        self.assertEqual(stable_plan_json(SAMPLE_PLAN), stable_plan_json(SAMPLE_PLAN))
+
+    def test_plans_differing_only_in_header_share_no_ids(self):
+        with tempfile.TemporaryDirectory() as directory:
+            other_ids = node_ids(stable_plan_json(write_other_form_plan(directory)))
+
+        sample_ids = node_ids(stable_plan_json(SAMPLE_PLAN))
+        self.assertEqual(len(set(sample_ids)), len(sample_ids))
+        self.assertEqual(len(set(sample_ids) & set(other_ids)), 0)
+
+
+@skipUnless(find_spec('autocorrect'), "пакет autocorrect не установлен")
+class AutocorrectSpellerBackendTests(SimpleTestCase):
+    def test_local_dictionary(self):
+        with tempfile.TemporaryDirectory() as directory:
+            dictionary = os.path.join(directory, "word_count.json")
+            with open(dictionary, "w", encoding="utf-8") as file:
+                json.dump({"основы": 100, "программирования": 100}, file, ensure_ascii=False)
+            speller = AutocorrectSpellerBackend(dictionary=dictionary)
+        self.assertEqual(speller.spell("Основы программирования"), [])
+        self.assertEqual(speller.spell("Основы програмирования"), [
+            {'word': "програмирования", 's': ["программирования"]}
+        ])
+
+    def test_missing_dictionary_fails_without_download(self):
+        with tempfile.TemporaryDirectory() as directory:
+            with self.assertRaises(ImproperlyConfigured):
+                AutocorrectSpellerBackend(dictionary=os.path.join(directory, "missing.json"))
+            # Пакет без архивов словарей: скачивание не должно начинаться
+            with mock.patch('autocorrect.PATH', directory), mock.patch('autocorrect.urlretrieve') as download:
+                with self.assertRaisesMessage(ImproperlyConfigured, "dictionary"):
+                    AutocorrectSpellerBackend(lang='ru')
+            download.assert_not_called()
+
+
+@override_settings(CACHES=TEST_CACHES)
+class UpsertJsonToModelsTests(TestCase):
+    def setUp(self):
+        self.first, self.second = load_synthetic_plans([1, 2])
+
+    def plan_rows(self, plan_id):
+        """Все строки дерева плана в виде словарей полей, по моделям."""
+        return {
+            'plans': list(StudyPlan.objects.filter(id=plan_id).values()),
+            'categories': list(Category.objects.filter(study_plan=plan_id).order_by('id').values()),
+            'cycles': list(StudyCycle.objects.filter(category__study_plan=plan_id).order_by('id').values()),
+            'modules': list(Module.objects.filter(studey_cycle__category__study_plan=plan_id).order_by('id').values()),
+            'disciplines': list(
+                Disipline.objects.filter(module__studey_cycle__category__study_plan=plan_id).order_by('id').values()
+            ),
+            'clock_cells': list(
+                ClockCell.objects.filter(
+                    Q(plan_string__module__studey_cycle__category__study_plan=plan_id)
+                    | Q(module_plan_string__studey_cycle__category__study_plan=plan_id)
+                ).order_by('id').values()
+            ),
+        }
+
+    def upsert(self, rup_data):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return upsert_json_to_models(rup_data, text_warnings={})
+
+    def test_reimport_of_same_plan_changes_nothing(self):
+        before = self.plan_rows(self.first['id'])
+        stats = self.upsert(parse_synthetic_plan(1))
+        self.assertEqual(
+            stats, {model.__name__: {'inserted': 0, 'updated': 0, 'deleted': 0} for model in PLAN_MODELS}
+        )
+        self.assertEqual(self.plan_rows(self.first['id']), before)
+
+    def test_edited_plan(self):
+        second_before = self.plan_rows(self.second['id'])
+        before = self.plan_rows(self.first['id'])
+
+        edited = parse_synthetic_plan(1)
+        category = edited['stady_plan'][0]
+        study_cycle = category['children'][0]
+        module = study_cycle['plans_of_string'][0]
+        renamed_index = module['code_of_discipline']
+        module['discipline'] = "Переименованный модуль"
+        # Последняя дисциплина модуля: удаление не сдвигает последовательность индексов
+        removed = module['children_strings'].pop()
+        category['children'].append(
+            {'id': str(uuid.uuid4()), 'identificator': "Ц99", 'cycles': "Новый цикл", 'plans_of_string': []}
+        )
+
+        removed_row = Disipline.objects.get(
+            module__studey_cycle__category__study_plan=self.first['id'], index=removed['code_of_discipline']
+        )
+        removed_cells = ClockCell.objects.filter(plan_string=removed_row).count()
+        self.assertGreater(removed_cells, 0)
+
+        stats = self.upsert(edited)
+        self.assertEqual(stats, {
+            'StudyPlan': {'inserted': 0, 'updated': 0, 'deleted': 0},
+            'Category': {'inserted': 0, 'updated': 0, 'deleted': 0},
+            'StudyCycle': {'inserted': 1, 'updated': 0, 'deleted': 0},
+            'Module': {'inserted': 0, 'updated': 1, 'deleted': 0},
+            'Disipline': {'inserted': 0, 'updated': 0, 'deleted': 1},
+            'ClockCell': {'inserted': 0, 'updated': 0, 'deleted': removed_cells},
+        })
+
+        after = self.plan_rows(self.first['id'])
+        # Сохраненные строки остаются со своими id, новые id из разбора не попадают в БД
+        self.assertEqual([row['id'] for row in after['plans']], [self.first['id']])
+        self.assertEqual(after['categories'], before['categories'])
+        self.assertEqual(len(after['cycles']), len(before['cycles']) + 1)
+        self.assertEqual([row['id'] for row in after['modules']], [row['id'] for row in before['modules']])
+        renamed = Module.objects.get(studey_cycle__category__study_plan=self.first['id'], index=renamed_index)
+        self.assertEqual(renamed.name, "Переименованный модуль")
+        self.assertIn(renamed.id, [row['id'] for row in before['modules'] if row['index'] == renamed_index])
+        self.assertEqual(
+            [row for row in before['disciplines'] if row['id'] != removed_row.id], after['disciplines']
+        )
+        self.assertEqual(len(after['clock_cells']), len(before['clock_cells']) - removed_cells)
+        self.assertFalse(ClockCell.objects.filter(plan_string=removed_row.id).exists())
+
+        self.assertEqual(self.plan_rows(self.second['id']), second_before)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class UpsertPlanIdentityTests(TestCase):
+    def setUp(self):
+        self.sample = parse_plan(SAMPLE_PLAN)
+        with tempfile.TemporaryDirectory() as directory:
+            self.other_form = parse_plan(write_other_form_plan(directory))
+
+    def upsert(self, rup_data):
+        with contextlib.redirect_stdout(io.StringIO()):
+            return upsert_json_to_models(rup_data, text_warnings={})
+
+    def test_plans_differing_only_in_form_of_study(self):
+        self.assertEqual(
+            (self.sample['specialization_code'], self.sample['admission_year']),
+            (self.other_form['specialization_code'], self.other_form['admission_year']),
+        )
+        self.upsert(self.sample)
+        sample_modules = set(Module.objects.values_list('id', flat=True))
+        stats = self.upsert(self.other_form)
+
+        # Второй план добавляется целиком и не затирает первый
+        self.assertEqual(stats['StudyPlan'], {'inserted': 1, 'updated': 0, 'deleted': 0})
+        self.assertEqual(sum(counts['deleted'] for counts in stats.values()), 0)
+        self.assertEqual(
+            set(StudyPlan.objects.values_list('id', 'plan_identity')),
+            {(self.sample['id'], self.sample['plan_identity']), (self.other_form['id'], self.other_form['plan_identity'])},
+        )
+        self.assertEqual(
+            set(Module.objects.filter(studey_cycle__category__study_plan=self.sample['id']).values_list('id', flat=True)),
+            sample_modules,
+        )
+
+        # Повторный импорт каждого из планов попадает в свою строку
+        for rup_data in (parse_plan(SAMPLE_PLAN), self.other_form):
+            stats = self.upsert(rup_data)
+            self.assertEqual(
+                stats, {model.__name__: {'inserted': 0, 'updated': 0, 'deleted': 0} for model in PLAN_MODELS}
+            )
+        self.assertEqual(StudyPlan.objects.count(), 2)
+
+    def test_plan_loaded_without_identity_is_matched(self):
+        self.upsert(self.sample)
+        StudyPlan.objects.update(plan_identity=None)
+        stats = self.upsert(parse_plan(SAMPLE_PLAN))
+        self.assertEqual(sum(counts['inserted'] + counts['deleted'] for counts in stats.values()), 0)
+        self.assertEqual(StudyPlan.objects.get().plan_identity, self.sample['plan_identity'])
+
+    def test_ambiguous_match_raises(self):
+        self.upsert(self.sample)
+        StudyPlan.objects.create(
+            id=str(uuid.uuid4()),
+            specialization_code=self.sample['specialization_code'],
+            admission_year=self.sample['admission_year'],
+            plan_identity=self.sample['plan_identity'],
+        )
+        with self.assertRaises(StudyPlan.MultipleObjectsReturned):
+            self.upsert(parse_plan(SAMPLE_PLAN))
+
+
+def plan_strings_json(plan):
+    """Строки плана (модули и дисциплины) JSON-вида plan_to_json."""
+    for category in plan['stady_plan']:
+        for study_cycle in category['children']:
+            for module in study_cycle['plans_of_string']:
+                yield module
+                yield from module['children_strings']
+
+
+class PlanToJsonTests(TestCase):
+    CELL_FIELDS = (
+        'id', 'code_of_type_work', 'code_of_type_hours', 'course', 'semestr', 'count_of_clocks',
+        'plan_string_id', 'module_plan_string_id',
+    )
+
+    def setUp(self):
+        self.rup_data = parse_plan(SAMPLE_PLAN, stable_ids=True)
+
+    def test_nested_shape(self):
+        hours = self.rup_data['hours']
+        plan = plan_to_json(self.rup_data)
+        self.assertNotIn('hours', plan)
+
+        cells = []
+        for plan_string in plan_strings_json(plan):
+            for course in plan_string['clock_cells']:
+                self.assertEqual(set(course), {'id', 'course_number', 'terms'})
+                self.assertTrue(course['terms'])
+                for term in course['terms']:
+                    self.assertEqual(set(term), {'id', 'term_number', 'clock_cells'})
+                    for clock in term['clock_cells']:
+                        self.assertEqual((clock['course'], clock['term']), (course['course_number'], term['term_number']))
+                        self.assertEqual(clock['parent_string_id'], plan_string['id'])
+                        cells.append(clock)
+
+        self.assertEqual(len(cells), len(hours.cell_positions))
+        self.assertEqual(len({clock['id'] for clock in cells}), len(cells))
+        self.assertEqual(sum(clock['count_of_clocks'] for clock in cells), int(hours.counts.sum()))
+
+    def test_legacy_loader_round_trip_matches_bulk_loader(self):
+        with contextlib.redirect_stdout(io.StringIO()):
+            load_json_to_models_bulk(self.rup_data, text_warnings={})
+            bulk_cells = list(ClockCell.objects.order_by('id').values_list(*self.CELL_FIELDS))
+            self.assertEqual(len(bulk_cells), len(self.rup_data['hours'].cell_positions))
+            with mock.patch('parserapp.models_loader.validate_text', return_value=None):
+                load_json_to_models(self.rup_data)
+        self.assertEqual(list(ClockCell.objects.order_by('id').values_list(*self.CELL_FIELDS)), bulk_cells)
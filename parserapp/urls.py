@@ -0,0 +1,11 @@
+from django.urls import path
+
+from parserapp import views
+
+app_name = 'parserapp'
+
+urlpatterns = [
+    path('plans/', views.plan_list, name='plan_list'),
+    path('plans/<str:plan_id>/', views.plan_detail, name='plan_detail'),
+    path('disciplines/<str:discipline_id>/clock_cells/', views.discipline_clock_cells, name='discipline_clock_cells'),
+]
@@ -1,106 +1,507 @@
-from parserapp.models import WhitelistWord
-from pyaspeller import YandexSpeller
+import hashlib
+import json
+import logging
+import os
 import re
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from parserapp.hours import hour_violations
+from parserapp.models import WhitelistWord, SpellCheckResult
+from pyaspeller import YandexSpeller
+
+# Версия проверок: увеличивается при изменениях, влияющих на предупреждения
+VALIDATORS_VERSION = "3"
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"[А-Яа-яЁёA-Za-z]+")
+
+class SpellerBackend:
+    """
+    Интерфейс бэкенда проверки орфографии. spell(text) возвращает список
+    найденных ошибок в формате Yandex Speller: [{'word': ..., 's': [...]}].
+    """
+    name = None
+    version = None
+    concurrent = False  # True для сетевых бэкендов: тексты проверяются в пуле потоков
+
+    def spell(self, text):
+        raise NotImplementedError
+
+class YandexSpellerBackend(SpellerBackend):
+    """Сетевая проверка через Yandex Speller (запрос на каждый текст)."""
+    name = 'yandex'
+    version = 'yandex-1'
+    concurrent = True
+
+    def __init__(self, **options):
+        self.speller = YandexSpeller(**options)
+
+    def spell(self, text):
+        return [{'word': change['word'], 's': change['s']} for change in self.speller.spell(text)]
+
+class AutocorrectSpellerBackend(SpellerBackend):
+    """
+    Локальная проверка по частотному словарю autocorrect, работает без сети.
+    dictionary - путь к word_count.json ({слово: частота}); без него
+    используется архив data/<lang>.tar.gz из пакета autocorrect. Если нет
+    ни того, ни другого, бэкенд сразу бросает ImproperlyConfigured, а не
+    пытается скачать словарь (autocorrect делает это сам).
+    """
+    name = 'autocorrect'
+    version = 'autocorrect-1'
+
+    def __init__(self, lang='ru', dictionary=None):
+        import autocorrect
+
+        nlp_data = None
+        if dictionary:
+            if not os.path.isfile(dictionary):
+                raise ImproperlyConfigured(f"Словарь autocorrect не найден: {dictionary}")
+            with open(dictionary, encoding='utf-8') as file:
+                nlp_data = json.load(file)
+        elif not os.path.isfile(os.path.join(autocorrect.PATH, "data", f"{lang}.tar.gz")):
+            raise ImproperlyConfigured(
+                f"Для бэкенда autocorrect нет словаря языка '{lang}': укажите путь к word_count.json "
+                f"в SPELLER_OPTIONS['autocorrect']['dictionary'] или положите {lang}.tar.gz "
+                f"в {os.path.join(autocorrect.PATH, 'data')}"
+            )
+        self.speller = autocorrect.Speller(lang=lang, nlp_data=nlp_data)
+
+    def spell(self, text):
+        changes = []
+        for word in WORD_RE.findall(text):
+            corrected = self.speller.autocorrect_word(word.lower())
+            if corrected != word.lower():
+                changes.append({'word': word, 's': [corrected]})
+        return changes
+
+SPELLER_BACKENDS = {
+    backend.name: backend for backend in (YandexSpellerBackend, AutocorrectSpellerBackend)
+}
+
+@lru_cache(maxsize=None)
+def get_speller(name=None):
+    """
+    Возвращает экземпляр бэкенда проверки орфографии. По умолчанию берется
+    settings.SPELLER_BACKEND с параметрами settings.SPELLER_OPTIONS.
+    """
+    name = name or getattr(settings, 'SPELLER_BACKEND', 'yandex')
+    options = getattr(settings, 'SPELLER_OPTIONS', {}).get(name, {})
+    return SPELLER_BACKENDS[name](**options)
+
+def normalize_text(text):
+    """Приводит текст к ключу кеша: NFC, схлопнутые пробелы."""
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+class SpellCache:
+    """
+    Двухуровневый кеш ответов бэкенда проверки орфографии: LRU в памяти
+    процесса и таблица SpellCheckResult в БД. Ключ - версия бэкенда и
+    нормализованный текст. Кешируется ответ бэкенда до применения вайтлиста,
+    поэтому изменения вайтлиста действуют сразу и не делают записи устаревшими.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+
+    def spell(self, speller, text):
+        key = (speller.version, normalize_text(text))
+        if key in self.entries:
+            self.entries.move_to_end(key)
+            return self.entries[key]
+
+        changes = self.load(*key)
+        if changes is None:
+            changes = speller.spell(key[1])
+            self.store(*key, changes)
+        self.remember(key, changes)
+        return changes
+
+    def remember(self, key, changes):
+        self.entries[key] = changes
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    @staticmethod
+    def db_key(backend_version, text):
+        return hashlib.sha256(f"{backend_version}\n{text}".encode("utf-8")).hexdigest()
+
+    def load(self, backend_version, text):
+        result = SpellCheckResult.objects.filter(key=self.db_key(backend_version, text)).first()
+        return result.changes if result else None
+
+    def store(self, backend_version, text, changes):
+        try:
+            SpellCheckResult.objects.create(
+                key=self.db_key(backend_version, text),
+                backend_version=backend_version,
+                text=text,
+                changes=changes,
+            )
+        except IntegrityError:
+            pass  # запись уже сохранил параллельный импорт
+
+    def spell_many(self, speller, texts, batch_size=500, max_workers=8):
+        """
+        Проверяет набор нормализованных текстов: берет ответы из LRU, затем
+        пачками из БД, а оставшиеся отправляет в бэкенд (сетевой - в пуле
+        потоков до max_workers). Новые ответы сохраняются пачками.
+        Возвращает {текст: список изменений}.
+        """
+        results = {}
+        missing = []
+        for text in texts:
+            key = (speller.version, text)
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                results[text] = self.entries[key]
+            else:
+                missing.append(text)
+
+        for start in range(0, len(missing), batch_size):
+            batch = missing[start:start + batch_size]
+            stored = self.load_many(speller.version, batch)
+            unchecked = [text for text in batch if text not in stored]
+
+            if speller.concurrent and len(unchecked) > 1:
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    checked = dict(zip(unchecked, executor.map(speller.spell, unchecked)))
+            else:
+                checked = {text: speller.spell(text) for text in unchecked}
+            self.store_many(speller.version, checked)
+
+            for text, changes in {**stored, **checked}.items():
+                self.remember((speller.version, text), changes)
+                results[text] = changes
+        return results
+
+    def load_many(self, backend_version, texts):
+        keys = {self.db_key(backend_version, text): text for text in texts}
+        return {
+            keys[key]: changes
+            for key, changes in SpellCheckResult.objects.filter(key__in=keys).values_list('key', 'changes')
+        }
+
+    def store_many(self, backend_version, checked):
+        SpellCheckResult.objects.bulk_create(
+            [
+                SpellCheckResult(
+                    key=self.db_key(backend_version, text),
+                    backend_version=backend_version,
+                    text=text,
+                    changes=changes,
+                )
+                for text, changes in checked.items()
+            ],
+            ignore_conflicts=True,
+        )
+
+    def clear(self):
+        self.entries.clear()
+
+spell_cache = SpellCache(getattr(settings, 'SPELL_CACHE_SIZE', 10000))
+
+def evict_spell_cache(max_entries=None, max_age_days=None):
+    """
+    Удаляет из таблицы SpellCheckResult записи старше max_age_days и самые
+    старые записи сверх max_entries (по умолчанию SPELL_CACHE_MAX_AGE_DAYS
+    и SPELL_CACHE_MAX_ENTRIES из настроек). Возвращает число удаленных записей.
+    """
+    max_entries = max_entries or getattr(settings, 'SPELL_CACHE_MAX_ENTRIES', 100000)
+    max_age_days = max_age_days or getattr(settings, 'SPELL_CACHE_MAX_AGE_DAYS', 90)
+
+    deleted, _ = SpellCheckResult.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=max_age_days)
+    ).delete()
+
+    # Дата самой новой записи, не попадающей в лимит: она и все более старые удаляются
+    cutoff = SpellCheckResult.objects.order_by('-created_at').values_list('created_at', flat=True)[max_entries:max_entries + 1]
+    if cutoff:
+        deleted += SpellCheckResult.objects.filter(created_at__lte=cutoff[0]).delete()[0]
+    return deleted
+
+# Окончания русских словоформ для упрощенного стемминга (от длинных к коротким)
+RUSSIAN_ENDINGS = sorted({
+    'иями', 'ями', 'ами', 'иях', 'иям', 'ием', 'ией',
+    'ого', 'его', 'ому', 'ему', 'ыми', 'ими', 'ых', 'их',
+    'ая', 'яя', 'ое', 'ее', 'ые', 'ие', 'ый', 'ий', 'ой', 'ей', 'ую', 'юю',
+    'ом', 'ем', 'ах', 'ях', 'ам', 'ям', 'ов', 'ев', 'ия', 'ии', 'ию', 'ью',
+    'ы', 'и', 'а', 'я', 'о', 'е', 'у', 'ю', 'ь', 'й',
+}, key=len, reverse=True)
+MIN_STEM_LENGTH = 3
+
+@lru_cache(maxsize=None)
+def get_morph_analyzer():
+    """Возвращает морфологический анализатор pymorphy3/pymorphy2, если он установлен."""
+    for module_name in ('pymorphy3', 'pymorphy2'):
+        try:
+            module = __import__(module_name)
+        except ImportError:
+            continue
+        return module.MorphAnalyzer()
+    return None
+
+@lru_cache(maxsize=100000)
+def normalize_word(word):
+    """
+    Приводит словоформу к общей основе: лемма через pymorphy, если он
+    установлен, иначе упрощенный стемминг отбрасыванием окончания.
+    """
+    word = word.lower().replace('ё', 'е')
+    morph = get_morph_analyzer()
+    if morph is not None:
+        return morph.parse(word)[0].normal_form.replace('ё', 'е')
+    for ending in RUSSIAN_ENDINGS:
+        if word.endswith(ending) and len(word) - len(ending) >= MIN_STEM_LENGTH:
+            return word[:-len(ending)]
+    return word
+
+class WhitelistIndex:
+    """Вайтлист в памяти: точные формы слов и их нормализованные основы."""
+
+    def __init__(self, words):
+        self.words = set(words)
+        self.stems = {normalize_word(word) for word in self.words}
+
+    def __contains__(self, word):
+        word = word.lower()
+        return word in self.words or normalize_word(word) in self.stems
+
+    def __len__(self):
+        return len(self.words)
+
+class WhitelistCache:
+    """
+    Кеш вайтлиста на процесс. Слова читаются из БД одним запросом при первом
+    обращении и хранятся до invalidate(), который вызывают сигналы
+    post_save/post_delete WhitelistWord и массовые операции с вайтлистом.
+    version растет при каждой инвалидации, чтобы зависимые кеши могли
+    понять, что результаты с учетом вайтлиста устарели.
+    """
+
+    def __init__(self):
+        self.words = None
+        self.version = 0
+        self.queries = 0  # число запросов к WhitelistWord за время жизни процесса
+
+    def get(self):
+        if self.words is None:
+            self.words = WhitelistIndex(WhitelistWord.objects.values_list('word', flat=True))
+            self.queries += 1
+            logger.debug("Вайтлист загружен из БД: %d слов, запрос #%d", len(self.words), self.queries)
+        return self.words
+
+    def invalidate(self):
+        self.words = None
+        self.version += 1
+
+whitelist_cache = WhitelistCache()
 
 def get_whitelist():
-    """Возвращает множество слов из вайтлиста, используя кеш."""
-    _cached_whitelist = set(WhitelistWord.objects.values_list('word', flat=True))
-    return _cached_whitelist
+    """Возвращает вайтлист (WhitelistIndex), используя кеш."""
+    return whitelist_cache.get()
+
+def validation_fingerprint():
+    """
+    Отпечаток настроек проверки орфографии: версия бэкенда из
+    settings.SPELLER_BACKEND и содержимое вайтлиста. Сохраняется в плане
+    вместе с хешем файла: после смены бэкенда или правки вайтлиста
+    неизменившийся файл загружается и проверяется заново.
+    """
+    backend = SPELLER_BACKENDS[getattr(settings, 'SPELLER_BACKEND', 'yandex')]
+    digest = hashlib.sha256(f"{backend.version}\n".encode("utf-8"))
+    for word in sorted(get_whitelist().words):
+        digest.update(f"{word}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def add_to_whitelist(words, batch_size=1000):
+    """
+    Добавляет слова в вайтлист пачками в одной транзакции, пропуская уже
+    существующие. Возвращает число добавленных слов.
+    """
+    words = {word.strip().lower() for word in words if word.strip()}
+    with transaction.atomic():
+        count_before = WhitelistWord.objects.count()
+        WhitelistWord.objects.bulk_create(
+            [WhitelistWord(word=word) for word in sorted(words)],
+            batch_size=batch_size,
+            ignore_conflicts=True,
+        )
+        added = WhitelistWord.objects.count() - count_before
+    # bulk_create не отправляет post_save, поэтому сбрасываем кеш явно
+    whitelist_cache.invalidate()
+    return added
+
+def read_whitelist_file(path):
+    """Читает слова из текстового файла: по одному на строку, '#' - комментарий."""
+    with open(path, encoding='utf-8') as file:
+        return [line.split('#', 1)[0].strip() for line in file if line.split('#', 1)[0].strip()]
+
+def write_whitelist_file(path):
+    """Выгружает вайтлист в текстовый файл по одному слову на строку. Возвращает число слов."""
+    words = list(WhitelistWord.objects.order_by('word').values_list('word', flat=True))
+    with open(path, 'w', encoding='utf-8') as file:
+        file.writelines(f"{word}\n" for word in words)
+    return len(words)
 
-def validate_text(text):
+def spelling_errors(changes, whitelist_words):
+    """Превращает ответ бэкенда в список предупреждений, пропуская слова из вайтлиста."""
+    errors = []
+    for change in changes:
+        word_lower = change['word'].lower()
+        if word_lower not in whitelist_words:
+            errors.append(f"Возможно ошибка в слове '{change['word']}' возможно это подходящее слово: {change['s']}")
+    return errors or None
+
+def validate_text(text, speller=None):
     """
-    Проверяет текст на наличие ошибок с помощью Yandex Speller,
-    игнорируя слова из вайтлиста.
+    Проверяет текст на наличие ошибок бэкендом проверки орфографии
+    (по умолчанию из настроек), игнорируя слова из вайтлиста.
     Возвращает список ошибок или None, если ошибок нет.
     """
-    speller = YandexSpeller()
-    changes = speller.spell(text)
+    speller = speller or get_speller()
+    changes = spell_cache.spell(speller, text)
     if changes:
-        errors = []
-        whitelist_words = get_whitelist()  # Используем кешированное множество
-        for change in changes:
-            word_lower = change['word'].lower()
-            if word_lower not in whitelist_words:
-                errors.append(f"Возможно ошибка в слове '{change['word']}' возможно это подходящее слово: {change['s']}")
-        return errors
+        return spelling_errors(changes, get_whitelist())  # Используем кешированное множество
     return None
 
-def validate_discipline_index(index: str, previous_indices: dict):
+def validate_texts(texts, speller=None):
     """
-    Проверяет формат индекса дисциплины и последовательность индексов,
-    учитывая двусоставные индексы модулей (МДК.01.01).
+    Пакетная проверка орфографии: каждый уникальный текст проверяется один
+    раз независимо от числа вхождений, сетевые бэкенды опрашиваются
+    параллельно (SPELL_CHECK_WORKERS потоков), вайтлист читается один раз.
+    Возвращает {исходный текст: список ошибок или None}.
+    """
+    speller = speller or get_speller()
+    normalized = {text: normalize_text(text) for text in set(texts) if text is not None}
+    changes = spell_cache.spell_many(
+        speller,
+        sorted(set(normalized.values())),
+        batch_size=getattr(settings, 'SPELL_CHECK_BATCH_SIZE', 500),
+        max_workers=getattr(settings, 'SPELL_CHECK_WORKERS', 8),
+    )
 
-    Args:
-        index: Индекс дисциплины (например, "МДК.01.01").
-        previous_indices: Словарь, хранящий предыдущие индексы.
-                          Ключи - комбинация префикса и номера модуля (МДК.01, МДК.1).
+    whitelist_words = get_whitelist() if any(changes.values()) else WhitelistIndex([])
+    return {
+        text: spelling_errors(changes[key], whitelist_words) if changes[key] else None
+        for text, key in normalized.items()
+    }
 
-    Returns:
-        Список ошибок или None, если ошибок нет.
+# Префиксы индексов дисциплин по умолчанию. Для отдельных квалификаций
+# список переопределяется в settings.DISCIPLINE_INDEX_PREFIXES.
+DEFAULT_INDEX_PREFIXES = ("ОГСЭ", "ЕН", "ОП", "ОПЦ", "ПЦ", "ПМ", "МДК", "УП", "ПП", "ПДП")
+
+class DisciplineIndexValidator:
     """
-    if not index:
-        return ["Индекс дисциплины отсутствует."]
+    Проверка формата и последовательности индексов дисциплин.
 
-    index = index.strip()
+    Индекс - 'Префикс.Число' или 'Префикс.Число.Число' (МДК.01.01).
+    Последовательности ведутся отдельно для каждого префикса и формата
+    записи числа: УП.1, УП.2, ... и УП.01, УП.02, ... не мешают друг другу,
+    вторая часть (МДК.01.01, МДК.01.02) нумеруется внутри первой.
+    Ошибочный индекс не сдвигает последовательность.
+    """
+    GRAMMAR = re.compile(r"([А-Я]+)\.(\d{1,2})(?:\.(\d{1,2}))?")
 
-    match = re.match(r"([А-Я]+)\.(\d{1,2}(?:\.\d{1,2})?)", index)
-    if not match:
-        return [f"Неверный формат индекса '{index}'. Ожидается формат 'Префикс.Число' или 'Префикс.Число.Число'."]
+    def __init__(self, prefixes=DEFAULT_INDEX_PREFIXES):
+        self.prefixes = frozenset(prefixes)
+        self.prefixes_message = ', '.join(prefixes)
 
-    prefix = match.group(1)
-    number_part = match.group(2)
+    def check(self, index, state):
+        """
+        Проверяет один индекс с учетом уже встреченных (state - словарь
+        состояния последовательностей, общий для всего плана).
+        Возвращает список ошибок или None, если ошибок нет.
+        """
+        if not index:
+            return ["Индекс дисциплины отсутствует."]
 
-    valid_prefixes = ["ОГСЭ", "ЕН", "ОПЦ", "ПЦ", "ПМ", "МДК", "УП", "ПП", "ПДП"]
-    if prefix not in valid_prefixes:
-        return [f"Недопустимый префикс '{prefix}' в индексе '{index}'. Допустимые префиксы: {', '.join(valid_prefixes)}."]
+        index = index.strip()
+        match = self.GRAMMAR.fullmatch(index)
+        if not match:
+            return [f"Неверный формат индекса '{index}'. Ожидается формат 'Префикс.Число' или 'Префикс.Число.Число'."]
 
-    if "." in number_part:
-        main_number_str, secondary_number_str = number_part.split(".")
-        main_number, secondary_number = int(main_number_str), int(secondary_number_str)
-    else:
-        main_number_str = number_part
-        main_number = int(main_number_str)
-        secondary_number = None
+        prefix, main_str, secondary_str = match.groups()
+        if prefix not in self.prefixes:
+            return [f"Недопустимый префикс '{prefix}' в индексе '{index}'. Допустимые префиксы: {self.prefixes_message}."]
 
-    # Создаем ключ, включающий номер модуля (МДК.01, МДК.1 и т.д.)
-    module_key = f"{prefix}.{main_number_str}"
+        main_number = int(main_str)
+        if secondary_str is None:
+            if ('double', prefix, main_str) in state:
+                return [f"Неверная последовательность индекса '{index}'. Индекс с одной цифрой не может идти после индекса с двумя."]
 
-    if module_key not in previous_indices:
-        previous_indices[module_key] = (None, None)  # Инициализируем запись
+            key = ('single', prefix, len(main_str))
+            previous = state.get(key)
+            if previous is not None and main_number != previous + 1:
+                expected = str(previous + 1).zfill(len(main_str))
+                return [f"Неверная последовательность индекса '{index}'. Ожидается '{prefix}.{expected}'."]
+            state[key] = main_number
+            return None
 
-    prev_main, prev_secondary = previous_indices[module_key]
+        secondary_number = int(secondary_str)
+        key = ('double', prefix, main_str)
+        previous = state.get(key, 0)
+        if secondary_number != previous + 1:
+            expected = str(previous + 1).zfill(len(secondary_str))
+            return [f"Неверная последовательность индекса '{index}'. Ожидается '{prefix}.{main_str}.{expected}'."]
+        state[key] = secondary_number
+        return None
 
-    if prev_main is None:  # Первый индекс для данного модуля
-        if secondary_number is None and main_number != int(main_number_str): #проверка на валидность индекса, если он без подчасти
-            return [f"Неверная последовательность индекса '{index}'. Ожидается '{prefix}.1' или '{prefix}.01'."]
-        if secondary_number is not None and secondary_number != 1:
-            return [f"Неверная последовательность индекса '{index}'. Ожидается '{prefix}.{main_number_str}.1' или '{prefix}.0{main_number_str}.01'."]
-        previous_indices[module_key] = (main_number, secondary_number)
-    else:  # Индекс для данного модуля уже существует
-        if secondary_number is None:  # Если текущий индекс - "Префикс.Число"
-            if prev_secondary is not None:
-                return [f"Неверная последовательность индекса '{index}'. Индекс с одной цифрой не может идти после индекса с двумя."]
-            if main_number != prev_main + 1:
-                return [f"Неверная последовательность индекса '{index}'. Ожидается '{prefix}.{prev_main + 1}'."]
-            previous_indices[module_key] = (main_number, None)
-        else:  # Если текущий индекс - "Префикс.Число.Число"
-            if prev_secondary is None:
-                if main_number != prev_main or secondary_number != 1:
-                    return [f"Неверная последовательность индекса '{index}'. Ожидается '{prefix}.{prev_main}.1'."]
-            else:
-                if main_number != prev_main or secondary_number != prev_secondary + 1:
-                    return [f"Неверная последовательность индекса '{index}'. Ожидается '{prefix}.{prev_main}.{prev_secondary + 1}'."]
-            previous_indices[module_key] = (main_number, secondary_number)
+    def validate_plan(self, indices_by_module):
+        """
+        Проверяет все индексы дисциплин плана за один проход.
+        indices_by_module - {ключ модуля: [индексы дисциплин по порядку]}.
+        Возвращает {ключ модуля: [список ошибок или None для каждого индекса]}.
+        """
+        state = {}
+        return {
+            module: [self.check(index, state) for index in indices]
+            for module, indices in indices_by_module.items()
+        }
 
-    return None
+@lru_cache(maxsize=None)
+def get_index_validator(qualification=None):
+    """Возвращает валидатор индексов с реестром префиксов для квалификации."""
+    registry = getattr(settings, 'DISCIPLINE_INDEX_PREFIXES', {})
+    return DisciplineIndexValidator(registry.get(qualification, DEFAULT_INDEX_PREFIXES))
+
+def validate_plan_indices(indices_by_module, qualification=None):
+    """Пакетная проверка индексов дисциплин плана, см. DisciplineIndexValidator.validate_plan."""
+    return get_index_validator(qualification).validate_plan(indices_by_module)
+
+def validate_discipline_index(index: str, previous_indices: dict):
+    """
+    Проверяет формат индекса дисциплины и последовательность индексов,
+    учитывая двусоставные индексы модулей (МДК.01.01).
+
+    Args:
+        index: Индекс дисциплины (например, "МДК.01.01").
+        previous_indices: Словарь состояния последовательностей,
+                          общий для всех индексов плана.
+
+    Returns:
+        Список ошибок или None, если ошибок нет.
+    """
+    return get_index_validator().check(index, previous_indices)
 
 def validate_discipline_hours(discipline):
     """
     Проверяет, что суммарное количество часов за семестр у дисциплины
     равняется сумме часов по всем ячейкам, кроме итоговой.
+    Возвращает только первое расхождение; для всего плана см. validate_plan_hours.
     """
-    for course_index, course in enumerate(discipline.get("clock_cells", [])):
-        for term_index, term in enumerate(course.get('terms', [])):
+    for course in discipline.get("clock_cells", []):
+        for term in course.get('terms', []):
             total_hours = 0
             max_hours = 0
             for clock in term.get('clock_cells', []):
@@ -111,5 +512,34 @@ def validate_discipline_hours(discipline):
 
             if total_hours - max_hours != max_hours:
                  return [
-                    f"Сумма часов по ячейкам ({total_hours - max_hours}) не совпадает с итоговым количеством часов ({max_hours}) за семестр {term_index + 1} курса {course_index + 1} у дисциплины '{discipline.get('discipline')}'."]
-    return None
\ No newline at end of file
+                    f"Сумма часов по ячейкам ({total_hours - max_hours}) не совпадает с итоговым количеством часов ({max_hours}) за семестр {term['term_number']} курса {course['course_number']} у дисциплины '{discipline.get('discipline')}'."]
+    return None
+
+# Родительный падеж вида строки плана для сообщений о часах
+PLAN_STRING_KINDS = {'module': 'модуля', 'discipline': 'дисциплины'}
+
+def validate_plan_hours(hours, plan_strings):
+    """
+    Векторная проверка часов всех строк плана по матрице часов: находит все
+    семестры, где сумма часов по видам работ не совпадает с итоговой ячейкой.
+
+    Args:
+        hours: HourMatrix плана (rup['hours']).
+        plan_strings: Список пар (вид, строка плана), вид - 'module' или 'discipline'.
+
+    Returns:
+        Словарь {id строки: [ошибки]} только для строк с расхождениями.
+    """
+    strings_by_id = {plan_string["id"]: (kind, plan_string) for kind, plan_string in plan_strings}
+    warnings = {}
+    for violation in hour_violations(hours):
+        string_id = hours.string_ids[violation['row']]
+        if string_id not in strings_by_id:
+            continue
+        kind, plan_string = strings_by_id[string_id]
+        warnings.setdefault(string_id, []).append(
+            f"Сумма часов по ячейкам ({violation['components']}) не совпадает с итоговым количеством часов "
+            f"({violation['total']}) за семестр {violation['term']} курса {violation['course']} "
+            f"у {PLAN_STRING_KINDS[kind]} '{plan_string.get('discipline')}'."
+        )
+    return warnings
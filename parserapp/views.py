@@ -1,3 +1,78 @@
-from django.shortcuts import render
+import hashlib
 
-# Create your views here.
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import condition, require_GET
+
+from parserapp.plan_cache import get_plan_dict
+from parserapp.serialization import clock_cell_to_dict
+from parserapp.models import StudyPlan, Disipline
+
+# Поля плана в списке планов
+PLAN_LIST_FIELDS = ('id', 'specialization_code', 'qualification', 'admission_year', 'create_date', 'warnings')
+
+# Поля, по которым строится версия плана для ETag: план меняется только при записи в БД
+PLAN_VERSION_FIELDS = ('id', 'updated_at', 'importer_version', 'source_hash')
+
+
+def version_etag(*versions):
+    """Сильный ETag: sha256 от версий планов, из которых собран ответ."""
+    digest = hashlib.sha256()
+    for version in versions:
+        digest.update("|".join(str(value) for value in version).encode("utf-8"))
+        digest.update(b"\n")
+    return f'"{digest.hexdigest()}"'
+
+
+def plan_list_etag(request):
+    return version_etag(*StudyPlan.objects.order_by('id').values_list(*PLAN_VERSION_FIELDS))
+
+
+def plan_etag(request, plan_id):
+    version = StudyPlan.objects.filter(id=plan_id).values_list(*PLAN_VERSION_FIELDS).first()
+    return version_etag(version) if version else None
+
+
+def discipline_etag(request, discipline_id):
+    fields = [f"module__studey_cycle__category__study_plan__{field}" for field in PLAN_VERSION_FIELDS]
+    version = Disipline.objects.filter(id=discipline_id).values_list('id', *fields).first()
+    return version_etag(version) if version else None
+
+
+def json_response(data):
+    return JsonResponse(data, safe=False, json_dumps_params={'ensure_ascii': False})
+
+
+@require_GET
+@condition(etag_func=plan_list_etag)
+def plan_list(request):
+    """Список учебных планов без дерева."""
+    plans = [
+        dict(plan, id=str(plan['id']), create_date=str(plan['create_date']))
+        for plan in StudyPlan.objects.order_by('id').values(*PLAN_LIST_FIELDS)
+    ]
+    return json_response(plans)
+
+
+@require_GET
+@condition(etag_func=plan_etag)
+def plan_detail(request, plan_id):
+    """Дерево учебного плана в формате models_to_json (из кеша планов)."""
+    plan_dict = get_plan_dict(plan_id)
+    if plan_dict is None:
+        raise Http404("Учебный план не найден")
+    return json_response(plan_dict)
+
+
+@require_GET
+@condition(etag_func=discipline_etag)
+def discipline_clock_cells(request, discipline_id):
+    """Ячейки часов одной дисциплины."""
+    disipline = Disipline.objects.prefetch_related('clock_cells').filter(id=discipline_id).first()
+    if disipline is None:
+        raise Http404("Дисциплина не найдена")
+    return json_response({
+        "id": str(disipline.id),
+        "discipline": disipline.name,
+        "parent_string_id": str(disipline.module_id),
+        "clock_cells": [clock_cell_to_dict(clock, disipline.id) for clock in disipline.clock_cells.all()],
+    })